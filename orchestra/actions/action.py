@@ -1,11 +1,12 @@
 import os.path
 from collections import OrderedDict
-from typing import Set
+from typing import Dict, Optional, Set
 
 from loguru import logger
 
 # Only used for type hints, package-relative import not possible due to circular reference
 import orchestra.model.configuration
+from .. import globals
 from .util import run_user_script, run_internal_script, get_script_output
 from .util import try_run_internal_script, try_get_script_output
 
@@ -58,10 +59,26 @@ class Action:
         """Returns true if the action is satisfied."""
         raise NotImplementedError()
 
+    @property
+    def resources(self) -> "Dict[str, float]":
+        """Returns the amount of each resource (cpu, memory, disk_io) needed to run the action.
+        Resources which are not specified are assumed to be negligible.
+        """
+        return {}
+
+    @property
+    def estimated_duration(self) -> "Optional[float]":
+        """Returns the expected duration of the action in seconds, or None if no estimate is available"""
+        return None
+
     @property
     def environment(self) -> "OrderedDict[str, str]":
         """Returns additional environment variables provided to the script to be run"""
-        return self.config.global_env()
+        env = self.config.global_env()
+        # Let make share the global jobserver, unless the user explicitly configured MAKEFLAGS
+        if globals.jobserver is not None and "MAKEFLAGS" not in env:
+            env["MAKEFLAGS"] = globals.jobserver.makeflags
+        return env
 
     @property
     def _target_name(self):
@@ -46,5 +46,6 @@ class AnyOfAction:
         return self.dependencies == other.dependencies and self.preferred_action == other.preferred_action
 
     def __hash__(self):
-        # TODO: implement properly
-        return 0
+        # Must be consistent with __eq__. Hashing all the instances to the same value would make every dict or set
+        # lookup (e.g. in the dependency graph) linear in the number of AnyOf nodes
+        return hash((frozenset(self.actions), self.preferred_action))
@@ -0,0 +1,278 @@
+import os
+import shutil
+import subprocess
+import tarfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from .journal import Journal
+from .merge import ManifestEntry, manifest_entry, new_content_digest, same_content
+from ..exceptions import InternalException, UserException
+
+# Formats which can be used for binary archives, named after the extension of the compressed tarball
+BINARY_ARCHIVES_FORMATS = ("xz", "zst")
+
+# Format of the binary archives created in repositories which do not specify one in `binary_archives_formats`
+DEFAULT_BINARY_ARCHIVES_FORMAT = "xz"
+
+# Maps the extension of an archive to:
+#   - the tarfile compression method (None if tarfile does not support it)
+#   - the command line of a multithreaded compressor which reads from stdin and writes to stdout, used in place of the
+#     tarfile one if available
+#   - the command line of a decompressor which writes to stdout, needed if tarfile does not support the compression
+_COMPRESSIONS = {
+    ".xz": ("xz", ["xz", "--threads=0", "--stdout"], None),
+    ".zst": (None, ["zstd", "--threads=0", "--quiet", "--stdout"], ["zstd", "--decompress", "--quiet", "--stdout"]),
+    ".gz": ("gz", ["pigz", "--stdout"], None),
+    ".bz2": ("bz2", ["pbzip2", "--stdout"], None),
+    ".tar": ("", None, None),
+}
+
+# Python >= 3.12 warns if no extraction filter is specified, archives are trusted as they are created by orchestra
+_EXTRACT_KWARGS = {"filter": "fully_trusted"} if hasattr(tarfile, "fully_trusted_filter") else {}
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def extract_archive(
+    archive_path: str,
+    destination: str,
+    exclude: Iterable[str] = (),
+    journal: Optional[Journal] = None,
+    manifest: Optional[Dict[str, ManifestEntry]] = None,
+) -> List[str]:
+    """Extracts an archive into destination, decompressing it while it is read.
+    :param exclude: directories (relative to destination) whose content is not extracted
+    :param journal: if not None, the paths which do not exist yet and the existing ones which are replaced are recorded
+                    in the journal, so that an interrupted extraction can be rolled back with `rollback_journal`
+    :param manifest: if not None, the `manifest_entry` of each extracted file is added to it
+    :returns: the paths of the extracted files, symlinks and hardlinks (directories excluded) relative to destination
+    Existing files are replaced atomically, or left untouched (preserving their mtime) if their mode and content would
+    not change.
+    """
+    # Unknown extensions are left to tarfile compression detection
+    decompressor_command = _compression_for(archive_path)[2] if _has_known_extension(archive_path) else None
+    if decompressor_command is None:
+        return _extract_archive(
+            archive_path, destination, tarfile.open(archive_path, mode="r|*"), exclude, journal, manifest
+        )
+
+    _ensure_available(decompressor_command[0], archive_path)
+    decompressor = subprocess.Popen(decompressor_command + [archive_path], stdout=subprocess.PIPE)
+    try:
+        archive = tarfile.open(fileobj=decompressor.stdout, mode="r|")
+        extracted_files = _extract_archive(archive_path, destination, archive, exclude, journal, manifest)
+    finally:
+        decompressor.stdout.close()
+        returncode = decompressor.wait()
+
+    if returncode != 0:
+        raise InternalException(f"{decompressor_command[0]} exited with code {returncode} decompressing {archive_path}")
+    return extracted_files
+
+
+def _extract_archive(
+    archive_path: str,
+    destination: str,
+    archive: tarfile.TarFile,
+    exclude: Iterable[str],
+    journal: Optional[Journal],
+    manifest: Optional[Dict[str, ManifestEntry]],
+) -> List[str]:
+    extracted_files = []
+    directories = []
+    unchanged_files = 0
+    excluded_prefixes = tuple(directory.rstrip("/") + "/" for directory in exclude)
+
+    with archive:
+        for member in archive:
+            name = _normalize_member_name(member.name)
+            if name is None:
+                raise UserException(f"Refusing to extract {member.name} from {archive_path}: outside of destination")
+            member.name = name
+
+            if (name + "/").startswith(excluded_prefixes):
+                continue
+
+            exists = os.path.lexists(os.path.join(destination, name))
+            if journal is not None and not exists:
+                journal.created(name)
+
+            if member.isdir():
+                # Permissions and timestamps of directories are set once their content has been extracted, as
+                # extractall does
+                directories.append(member)
+                archive.extract(member, destination, set_attrs=False, **_EXTRACT_KWARGS)
+                continue
+
+            if not exists:
+                content_digest = _extract_member(archive, member, destination, name)
+            else:
+                replaced, content_digest = _replace_member(archive, member, destination, journal)
+                if not replaced:
+                    unchanged_files += 1
+            extracted_files.append(name)
+
+            if manifest is not None:
+                if member.islnk() and content_digest is None:
+                    # Hardlinks share the content of a file extracted earlier
+                    target_entry = manifest.get(_normalize_member_name(member.linkname))
+                    content_digest = target_entry[2] if target_entry is not None else None
+                manifest[name] = manifest_entry(os.path.join(destination, name), content_digest=content_digest)
+
+        for directory in sorted(directories, key=lambda member: member.name, reverse=True):
+            directory_path = os.path.join(destination, directory.name)
+            archive.chown(directory, directory_path, numeric_owner=False)
+            archive.utime(directory, directory_path)
+            archive.chmod(directory, directory_path)
+
+    if unchanged_files:
+        logger.debug(f"{unchanged_files} files were already up to date")
+    return extracted_files
+
+
+def _replace_member(
+    archive: tarfile.TarFile, member: tarfile.TarInfo, destination: str, journal: Optional[Journal]
+) -> Tuple[bool, Optional[str]]:
+    """Extracts a member next to the path it replaces, then renames it over that path unless they are the same.
+    The replaced path is backed up in the journal, if any. Returns False if the existing path was left untouched, and
+    the digest returned by `_extract_member`.
+    """
+    destination_path = os.path.join(destination, member.name)
+    if member.issym() and os.path.islink(destination_path) and os.readlink(destination_path) == member.linkname:
+        return False, None
+
+    temporary_name = os.path.join(os.path.dirname(member.name), f".{os.path.basename(member.name)}.orchestra-tmp")
+    temporary_path = os.path.join(destination, temporary_name)
+    if os.path.lexists(temporary_path):
+        os.remove(temporary_path)
+    content_digest = _extract_member(archive, member, destination, temporary_name)
+
+    if not member.issym() and same_content(temporary_path, destination_path):
+        os.remove(temporary_path)
+        return False, content_digest
+
+    if journal is not None:
+        journal.backup(member.name)
+    os.replace(temporary_path, destination_path)
+    return True, content_digest
+
+
+def _extract_member(archive: tarfile.TarFile, member: tarfile.TarInfo, destination: str, name: str) -> Optional[str]:
+    """Extracts a member to name (relative to destination).
+    Returns the hex digest (see `new_content_digest`) of the content of regular files, computed while they are
+    written, None for other members.
+    """
+    if not member.isreg():
+        original_name = member.name
+        member.name = name
+        try:
+            archive.extract(member, destination, **_EXTRACT_KWARGS)
+        finally:
+            member.name = original_name
+        return None
+
+    path = os.path.join(destination, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    digest = new_content_digest()
+    with archive.extractfile(member) as source, open(path, "wb") as target:
+        for chunk in iter(lambda: source.read(_COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            target.write(chunk)
+    # Same attributes set by TarFile.extract
+    archive.chown(member, path, numeric_owner=False)
+    archive.chmod(member, path)
+    archive.utime(member, path)
+    return digest.hexdigest()
+
+
+def _normalize_member_name(name: str):
+    """Returns the member name relative to the extraction directory, or None if it would be extracted outside of it"""
+    name = os.path.normpath(name)
+    if os.path.isabs(name) or name == os.pardir or name.startswith(os.pardir + os.sep):
+        return None
+    return name
+
+
+def create_archive(source_dir: str, archive_path: str):
+    """Creates an archive containing the content of source_dir.
+    Members are added in a deterministic order and are owned by root. The compression is chosen according to the
+    archive extension, using a multithreaded compressor if one is available.
+    """
+    compression, compressor_command, _ = _compression_for(archive_path)
+    if compression is None:
+        _ensure_available(compressor_command[0], archive_path)
+
+    with open(archive_path, "wb") as archive_file:
+        if compressor_command is not None and shutil.which(compressor_command[0]):
+            logger.debug(f"Compressing with {compressor_command[0]}")
+            compressor = subprocess.Popen(compressor_command, stdin=subprocess.PIPE, stdout=archive_file)
+            try:
+                with tarfile.open(fileobj=compressor.stdin, mode="w|") as archive:
+                    _add_directory_content(archive, source_dir)
+            finally:
+                compressor.stdin.close()
+                returncode = compressor.wait()
+
+            if returncode != 0:
+                raise InternalException(f"{compressor_command[0]} exited with code {returncode}")
+        else:
+            with tarfile.open(fileobj=archive_file, mode=f"w|{compression}") as archive:
+                _add_directory_content(archive, source_dir)
+
+
+def _compression_for(archive_path: str):
+    for extension, compression in _COMPRESSIONS.items():
+        if archive_path.endswith(extension):
+            return compression
+    raise InternalException(f"Unsupported archive format: {archive_path}")
+
+
+def _has_known_extension(archive_path: str) -> bool:
+    return any(archive_path.endswith(extension) for extension in _COMPRESSIONS)
+
+
+def _ensure_available(command: str, archive_path: str):
+    if shutil.which(command) is None:
+        raise UserException(f"{command} is required to handle {archive_path}, please install it")
+
+
+def _add_directory_content(archive: tarfile.TarFile, source_dir: str):
+    # Like `tar c *`, hidden entries in source_dir itself are not archived
+    top_level_names = sorted(name for name in os.listdir(source_dir) if not name.startswith("."))
+    for name in top_level_names:
+        path = os.path.join(source_dir, name)
+        _add_member(archive, path, name)
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            for current_dir_path, child_dir_names, child_file_names in os.walk(path):
+                child_dir_names.sort()
+                relative_dir_path = os.path.relpath(current_dir_path, source_dir)
+                # os.walk lists symlinks to directories as directories, they are added as links and not descended
+                for child_dir_name in list(child_dir_names):
+                    child_path = os.path.join(current_dir_path, child_dir_name)
+                    if os.path.islink(child_path):
+                        child_dir_names.remove(child_dir_name)
+                        child_file_names.append(child_dir_name)
+
+                for child_name in sorted(child_file_names + child_dir_names):
+                    _add_member(
+                        archive, os.path.join(current_dir_path, child_name), os.path.join(relative_dir_path, child_name)
+                    )
+
+
+def _add_member(archive: tarfile.TarFile, path: str, name: str):
+    member = archive.gettarinfo(path, arcname=name)
+    if member is None:
+        logger.warning(f"Not archiving {path}: unsupported file type")
+        return
+
+    member.uid = member.gid = 0
+    member.uname = member.gname = "root"
+
+    if member.isreg():
+        with open(path, "rb") as f:
+            archive.addfile(member, f)
+    else:
+        archive.addfile(member)
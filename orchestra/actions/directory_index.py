@@ -0,0 +1,35 @@
+import os
+from typing import Iterator, List, Set, Tuple
+
+
+def scan_directory(root: str) -> Iterator[Tuple[str, str, List[os.DirEntry]]]:
+    """Walks root with os.scandir, yielding for each directory its path relative to root ("" for root itself), its
+    path and its entries which are not directories (regular files, symlinks, including the ones to directories, ...).
+    The file type of the entries is the one returned by scandir, and their `stat(follow_symlinks=False)` is cached, so
+    no further system call per entry is needed to classify them. A missing root is treated as an empty directory.
+    """
+    pending = [("", root)]
+    while pending:
+        relative_dir_path, dir_path = pending.pop()
+        try:
+            entries = os.scandir(dir_path)
+        except FileNotFoundError:
+            continue
+
+        files = []
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append((os.path.join(relative_dir_path, entry.name), entry.path))
+                else:
+                    files.append(entry)
+        yield relative_dir_path, dir_path, files
+
+
+def index_directory(root: str) -> Set[str]:
+    """Returns the paths, relative to root, of all the entries under root which are not directories"""
+    return {
+        os.path.join(relative_dir_path, entry.name)
+        for relative_dir_path, _, entries in scan_directory(root)
+        for entry in entries
+    }
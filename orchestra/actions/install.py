@@ -1,17 +1,27 @@
 import glob
+import json
 import os
 import pathlib
 import shutil
-import stat
 import time
 from collections import OrderedDict, defaultdict
 from pathlib import Path
 from textwrap import dedent
-from typing import Optional
+from typing import List, Optional, Set
 
 from loguru import logger
 
 from .action import ActionForBuild
+from .archive import (
+    BINARY_ARCHIVES_FORMATS,
+    DEFAULT_BINARY_ARCHIVES_FORMAT,
+    create_archive,
+    extract_archive,
+)
+from .directory_index import index_directory
+from .journal import Journal, journal_backup_dir, rollback_journal
+from .merge import merge_directory
+from .post_install import post_install
 from .uninstall import uninstall
 from .util import run_user_script
 from ..exceptions import (
@@ -23,18 +33,29 @@ from ..exceptions import (
 from ..gitutils import lfs
 from ..gitutils import get_worktree_root
 from ..model.install_metadata import (
+    InstallMetadata,
     load_metadata,
     init_metadata_from_build,
     save_metadata,
     save_file_list,
+    save_manifest,
     is_installed,
+    load_file_list,
+    load_manifest,
+    remove_file_list,
+    remove_manifest,
+    remove_metadata,
     installed_component_license_path,
-    installed_component_file_list_path,
-    installed_component_metadata_path,
+    installed_component_journal_path,
+    metadata_file_paths,
+    find_file_owners,
 )
 
 
 class InstallAction(ActionForBuild):
+    # Directories removed from the tmproot as they would conflict with the ones installed by other components
+    _CONFLICTING_DIRECTORIES = ("share/info", "share/locale")
+
     def __init__(
         self,
         build,
@@ -71,50 +92,75 @@ class InstallAction(ActionForBuild):
         tmp_root = self.environment["TMP_ROOT"]
         orchestra_root = self.environment["ORCHESTRA_ROOT"]
 
+        self._recover_interrupted_installation()
+
         logger.debug("Preparing temporary root directory")
         self._prepare_tmproot()
 
-        pre_file_list = self._index_directory(tmp_root + orchestra_root, relative_to=tmp_root + orchestra_root)
+        pre_file_list = index_directory(tmp_root + orchestra_root)
 
         install_start_time = time.time()
-        if self.allow_binary_archive and self.binary_archive_exists():
-            self._install_from_binary_archive()
-            source = "binary archives"
-        elif self.allow_build:
-            self._build_and_install()
-            if self.create_binary_archive:
-                self._create_binary_archive()
-            source = "build"
-        else:
-            raise UserException(f"Could not find binary archive nor build: {self.build.qualified_name}")
-        install_end_time = time.time()
-
-        # Binary archive symlinks always need to be updated, not only when the binary archive is rebuilt
-        self.update_binary_archive_symlink()
-
-        post_file_list = self._index_directory(tmp_root + orchestra_root, relative_to=tmp_root + orchestra_root)
-        post_file_list.append(
-            os.path.relpath(installed_component_file_list_path(self.component.name, self.config), orchestra_root)
-        )
-        post_file_list.append(
-            os.path.relpath(installed_component_metadata_path(self.component.name, self.config), orchestra_root)
-        )
-        new_files = [f for f in post_file_list if f not in pre_file_list]
-
-        if not self.no_merge:
-            if is_installed(self.config, self.build.component.name):
-                logger.debug("Uninstalling previously installed build")
-                uninstall(self.build.component.name, self.config)
-
-            logger.debug("Merging installed files into orchestra root directory")
-            self._merge()
-
-            self._update_metadata(
-                new_files,
-                install_end_time - install_start_time,
-                source,
-                explicitly_requested,
-            )
+        # Records the changes made to the root when the binary archive is extracted straight into it
+        journal = None
+        # Filled while the files are extracted or merged in the root
+        manifest = {}
+        try:
+            if self.allow_binary_archive and self.binary_archive_exists():
+                # Binary archives do not need any post-processing, unless the tmproot is needed they can be extracted
+                # straight into the root
+                if not self.no_merge and not self.keep_tmproot:
+                    journal = Journal(
+                        installed_component_journal_path(self.component.name, self.config), orchestra_root
+                    )
+                # The files list is produced while extracting the archive, no need to walk the tmproot
+                post_file_list = set(self._install_from_binary_archive(journal, manifest))
+                source = "binary archives"
+            elif self.allow_build:
+                # The files list is produced while post-processing the tmproot, no need to walk it again
+                post_file_list = self._build_and_install()
+                if self.create_binary_archive:
+                    self._create_binary_archive()
+                source = "build"
+            else:
+                raise UserException(f"Could not find binary archive nor build: {self.build.qualified_name}")
+            install_time = time.time() - install_start_time
+
+            # Binary archive symlinks always need to be updated, not only when the binary archive is rebuilt
+            self.update_binary_archive_symlink()
+
+            # Sorted to keep the .idx deterministic, the metadata files come last
+            new_files = sorted(post_file_list - pre_file_list)
+            for metadata_file_path in metadata_file_paths(self.component.name, self.config):
+                relative_path = os.path.relpath(metadata_file_path, orchestra_root)
+                if relative_path not in pre_file_list and relative_path not in post_file_list:
+                    new_files.append(relative_path)
+
+            if not self.no_merge:
+                self._check_conflicting_files(new_files)
+
+                if journal is None:
+                    logger.debug("Merging installed files into orchestra root directory")
+                    self._merge(manifest)
+                else:
+                    # From now on the metadata are modified as well, save them to be able to restore them
+                    self._save_previous_metadata(install_time)
+
+                # The files of the previous build have been replaced by the merge or the extraction, only the ones
+                # which are not part of the new build are left to be removed
+                self._uninstall_previous_build(keep=new_files, backup=journal.backup if journal else None)
+
+                self._update_metadata(new_files, manifest, install_time, source, explicitly_requested)
+        except BaseException:
+            if journal is not None:
+                journal.close()
+                logger.warning(f"Rolling back installation of {self.component.name}")
+                self._rollback_installation()
+            raise
+
+        if journal is not None:
+            # The installation is complete, from now on the journal and the backups are not needed anymore
+            journal.commit()
+            os.remove(self._previous_metadata_path)
 
         if not self.keep_tmproot:
             logger.debug("Cleaning up tmproot")
@@ -124,10 +170,117 @@ class InstallAction(ActionForBuild):
             logger.debug("Discarding build directory")
             self._discard_build_directory()
 
-    def _update_metadata(self, file_list, install_time, source, set_manually_insalled):
+    def _uninstall_previous_build(self, keep=(), backup=None):
+        if is_installed(self.config, self.build.component.name):
+            logger.debug("Uninstalling previously installed build")
+            uninstall(self.build.component.name, self.config, keep=keep, backup=backup)
+
+    @property
+    def _previous_metadata_path(self):
+        """Path of the file storing the metadata of the installed build while it is replaced by a journaled install"""
+        return installed_component_journal_path(self.component.name, self.config) + ".previous"
+
+    def _save_previous_metadata(self, install_time):
+        metadata = load_metadata(self.component.name, self.config)
+        previous_metadata = {
+            # Identifies the metadata of the build being installed, to tell if they have been completely saved
+            "installing": {"recursive_hash": self.component.recursive_hash, "install_time": install_time},
+            "metadata": dict(metadata.serialize()) if metadata is not None else None,
+            "file_list": load_file_list(self.component.name, self.config) if metadata is not None else None,
+            "manifest": load_manifest(self.component.name, self.config),
+        }
+        temporary_path = self._previous_metadata_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(previous_metadata, f)
+        os.replace(temporary_path, self._previous_metadata_path)
+
+    def _recover_interrupted_installation(self):
+        """Completes or rolls back a previous journaled installation (see `Journal`) which was interrupted"""
+        journal_path = installed_component_journal_path(self.component.name, self.config)
+        if not os.path.exists(journal_path):
+            # Leftovers of an installation interrupted while it was being committed
+            shutil.rmtree(journal_backup_dir(journal_path), ignore_errors=True)
+            if os.path.exists(self._previous_metadata_path):
+                os.remove(self._previous_metadata_path)
+            return
+
+        previous_metadata = self._load_previous_metadata()
+        metadata = load_metadata(self.component.name, self.config)
+        if (
+            previous_metadata is not None
+            and metadata is not None
+            and metadata.recursive_hash == previous_metadata["installing"]["recursive_hash"]
+            and metadata.install_time == previous_metadata["installing"]["install_time"]
+        ):
+            # The metadata of the new build have been saved, only the commit was missing
+            logger.debug(f"Completing interrupted installation of {self.component.name}")
+            os.remove(journal_path)
+            shutil.rmtree(journal_backup_dir(journal_path), ignore_errors=True)
+            os.remove(self._previous_metadata_path)
+            return
+
+        logger.warning(f"Rolling back interrupted installation of {self.component.name}")
+        self._rollback_installation()
+
+    def _load_previous_metadata(self):
+        try:
+            with open(self._previous_metadata_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _rollback_installation(self):
+        """Restores the files and the metadata of the build installed before a journaled installation"""
+        journal_path = installed_component_journal_path(self.component.name, self.config)
+        rollback_journal(journal_path, self.environment["ORCHESTRA_ROOT"])
+
+        previous_metadata = self._load_previous_metadata()
+        if previous_metadata is None:
+            # The metadata had not been modified yet
+            return
+
+        component_name = self.component.name
+        if previous_metadata["metadata"] is not None:
+            save_file_list(component_name, previous_metadata["file_list"], self.config)
+            if previous_metadata["manifest"] is not None:
+                save_manifest(component_name, previous_metadata["manifest"], self.config)
+            else:
+                remove_manifest(component_name, self.config)
+            save_metadata(InstallMetadata(**previous_metadata["metadata"]), self.config)
+        else:
+            # The component was not installed, drop whatever metadata had been saved for the new build
+            for remove in (remove_metadata, remove_file_list):
+                try:
+                    remove(component_name, self.config)
+                except FileNotFoundError:
+                    pass
+            remove_manifest(component_name, self.config)
+        os.remove(self._previous_metadata_path)
+
+    def _check_conflicting_files(self, new_files):
+        """Warns about the files which are going to be merged but are owned by other installed components"""
+        conflicts = defaultdict(list)
+        for path, owners in find_file_owners(new_files, self.config).items():
+            for owner in owners:
+                if owner != self.component.name:
+                    conflicts[owner].append(path)
+
+        for owner, paths in sorted(conflicts.items()):
+            logger.warning(f"{len(paths)} files installed by {owner} will be overwritten by {self.component.name}")
+            for path in sorted(paths):
+                logger.debug(f"File owned by {owner} overwritten: {path}")
+
+    def _update_metadata(self, file_list, manifest, install_time, source, set_manually_insalled):
         # Save installed file list (.idx)
         save_file_list(self.component.name, file_list, self.config)
 
+        # Save size, mode and digest of the installed files (.manifest)
+        save_manifest(
+            self.component.name,
+            {path: manifest[path] for path in file_list if path in manifest},
+            self.config,
+        )
+
         # Save metadata
         metadata = load_metadata(self.component.name, self.config)
         if metadata is None:
@@ -159,15 +312,24 @@ class InstallAction(ActionForBuild):
         )
         self._run_internal_script(script)
 
-    def _install_from_binary_archive(self):
+    def _install_from_binary_archive(self, journal=None, manifest=None) -> List[str]:
+        """Installs the binary archive in the tmproot, returns the list of installed files.
+        If journal is not None the archive is extracted directly in the root, over the previous build, recording the
+        changes in the journal, and the entries of the extracted files are added to manifest
+        """
         # TODO: handle nonexisting binary archives
         logger.debug("Fetching binary archive")
         self._fetch_binary_archive()
-        logger.debug("Extracting binary archive")
-        self._extract_binary_archive()
 
-        logger.debug("Removing conflicting files")
-        self._remove_conflicting_files()
+        if journal is None:
+            logger.debug("Extracting binary archive")
+            extracted_files = self._extract_binary_archive()
+            logger.debug("Removing conflicting files")
+            self._remove_conflicting_files()
+            return extracted_files
+
+        logger.debug("Extracting binary archive into orchestra root directory")
+        return self._extract_binary_archive(self.environment["ORCHESTRA_ROOT"], journal=journal, manifest=manifest)
 
     def _fetch_binary_archive(self):
         binary_archive_path = self.locate_binary_archive()
@@ -188,19 +350,21 @@ class InstallAction(ActionForBuild):
                 if failures >= self.config.max_lfs_retries:
                     raise e
 
-    def _extract_binary_archive(self):
+    def _extract_binary_archive(self, destination=None, journal=None, manifest=None):
         if not self.binary_archive_exists():
             raise UserException("Binary archive not found!")
 
         archive_filepath = self.locate_binary_archive()
-        script = dedent(
-            f"""
-            mkdir -p "$TMP_ROOT$ORCHESTRA_ROOT"
-            cd "$TMP_ROOT$ORCHESTRA_ROOT"
-            tar xaf "{archive_filepath}"
-            """
+        if destination is None:
+            destination = f'{self.environment["TMP_ROOT"]}{self.environment["ORCHESTRA_ROOT"]}'
+        os.makedirs(destination, exist_ok=True)
+        return extract_archive(
+            archive_filepath,
+            destination,
+            exclude=self._CONFLICTING_DIRECTORIES,
+            journal=journal,
+            manifest=manifest,
         )
-        self._run_internal_script(script)
 
     def _implicit_dependencies(self):
         if self.allow_binary_archive and self.binary_archive_exists() or not self.allow_build:
@@ -211,7 +375,10 @@ class InstallAction(ActionForBuild):
     def _implicit_dependencies_for_hash(self):
         return {self.build.configure}
 
-    def _build_and_install(self):
+    def _build_and_install(self) -> Set[str]:
+        """Runs the install script and the post-install steps, returns the paths relative to the orchestra root of the
+        files installed in the tmproot
+        """
         env = self.environment
         env["RUN_TESTS"] = "1" if self.run_tests else "0"
 
@@ -223,37 +390,20 @@ class InstallAction(ActionForBuild):
 
         if self.build.component.skip_post_install:
             logger.debug("Skipping post install")
-        else:
-            self._post_install()
-
-    def _post_install(self):
-        logger.debug("Collecting tmproot files timestamps")
-        tmproot_timestamps = self._collect_times()
-
-        logger.debug("Dropping absolute paths from pkg-config")
-        self._drop_absolute_pkgconfig_paths()
-
-        logger.debug("Purging libtools' files")
-        self._purge_libtools_files()
-
-        # TODO: maybe this should be put into the configuration and not in orchestra itself
-        logger.debug("Converting hardlinks to symbolic")
-        self._hard_to_symbolic()
-
-        # TODO: maybe this should be put into the configuration and not in orchestra itself
-        logger.debug("Fixing RPATHs")
-        self._fix_rpath()
+            return index_directory(f'{env["TMP_ROOT"]}{env["ORCHESTRA_ROOT"]}')
+        return self._post_install()
 
-        # TODO: this should be put into the configuration and not in orchestra itself
-        logger.debug("Replacing NDEBUG preprocessor statements")
-        self._replace_ndebug(self.build.ndebug)
-
-        # TODO: this should be put into the configuration and not in orchestra itself
-        logger.debug("Replacing ASAN preprocessor statements")
-        self._replace_asan(self.build.asan)
-
-        logger.debug("Restoring tmproot files timestamps")
-        self._restore_mtimes(tmproot_timestamps)
+    def _post_install(self) -> Set[str]:
+        env = self.environment
+        # RPATH_PLACEHOLDER references other variables, let the shell expand it
+        rpath_placeholder = self._get_script_output('printf "%s" "$RPATH_PLACEHOLDER"')
+        installed_files = post_install(
+            f'{env["TMP_ROOT"]}{env["ORCHESTRA_ROOT"]}',
+            env["ORCHESTRA_ROOT"],
+            ndebug=self.build.ndebug,
+            asan=self.build.asan,
+            rpath_search_strings=[rpath_placeholder, env["ORCHESTRA_ROOT"]],
+        )
 
         if self.build.component.license:
             logger.debug("Copying license file")
@@ -274,114 +424,27 @@ class InstallAction(ActionForBuild):
                 """
             )
             self._run_internal_script(script)
+            installed_files.add(os.path.relpath(destination, env["ORCHESTRA_ROOT"]))
 
-    def _remove_conflicting_files(self):
-        script = dedent(
-            """
-            if test -d "$TMP_ROOT/$ORCHESTRA_ROOT/share/info"; then
-                rm -rf "$TMP_ROOT/$ORCHESTRA_ROOT/share/info";
-            fi
-            if test -d "$TMP_ROOT/$ORCHESTRA_ROOT/share/locale"; then
-                rm -rf "$TMP_ROOT/$ORCHESTRA_ROOT/share/locale";
-            fi
-            """
-        )
-        self._run_internal_script(script)
-
-    def _collect_times(self):
-        """Returns a dict[path, times], where times is a tuple(atime_ns, mtime_ns)"""
-        times = {}
-        for root, dirnames, filenames in os.walk(f'{self.environment["TMP_ROOT"]}{self.environment["ORCHESTRA_ROOT"]}'):
-            for path in filenames:
-                fullpath = os.path.join(root, path)
-                info = os.lstat(fullpath)
-                times[fullpath] = (info.st_atime_ns, info.st_mtime_ns)
-        return times
-
-    @staticmethod
-    def _restore_mtimes(mtimes):
-        for path, times in mtimes.items():
-            if os.path.exists(path):
-                os.utime(path, times=None, ns=times)
+        return installed_files
 
-    def _drop_absolute_pkgconfig_paths(self):
-        script = dedent(
-            """
-            cd "${TMP_ROOT}${ORCHESTRA_ROOT}"
-            if [ -e lib/pkgconfig ]; then
-                find lib/pkgconfig \\
-                    -name "*.pc" \\
-                    -exec sed -i 's|/*'"$ORCHESTRA_ROOT"'/*|${pcfiledir}/../..|g' {} ';'
-            fi
-            """
+    def _remove_conflicting_files(self):
+        for directory in self._CONFLICTING_DIRECTORIES:
+            path = os.path.join(f'{self.environment["TMP_ROOT"]}{self.environment["ORCHESTRA_ROOT"]}', directory)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def _merge(self, manifest=None):
+        # Files can be moved out of the tmproot only if it is going to be deleted
+        statistics = merge_directory(
+            f'{self.environment["TMP_ROOT"]}{self.environment["ORCHESTRA_ROOT"]}',
+            self.environment["ORCHESTRA_ROOT"],
+            move=not self.keep_tmproot,
+            manifest=manifest,
         )
-        self._run_internal_script(script)
-
-    def _purge_libtools_files(self):
-        script = dedent(
-            """
-            find "${TMP_ROOT}${ORCHESTRA_ROOT}" -name "*.la" -type f -delete
-            """
+        logger.debug(
+            f"Merged files: {statistics.moved} moved, {statistics.copied} copied, {statistics.unchanged} unchanged"
         )
-        self._run_internal_script(script)
-
-    def _hard_to_symbolic(self):
-        duplicates = defaultdict(list)
-        for root, dirnames, filenames in os.walk(f'{self.environment["TMP_ROOT"]}{self.environment["ORCHESTRA_ROOT"]}'):
-            for path in filenames:
-                path = os.path.join(root, path)
-                info = os.lstat(path)
-                inode = info.st_ino
-                if inode == 0 or info.st_nlink < 2 or not stat.S_ISREG(info.st_mode):
-                    continue
-
-                duplicates[inode].append(path)
-
-        for _, equivalent in duplicates.items():
-            base = equivalent.pop()
-            for alternative in equivalent:
-                os.unlink(alternative)
-                os.symlink(os.path.relpath(base, os.path.dirname(alternative)), alternative)
-
-    def _fix_rpath(self):
-        replace_dynstr = os.path.join(os.path.dirname(__file__), "..", "support", "elf-replace-dynstr.py")
-        self._run_internal_script(f'"{replace_dynstr}" "$TMP_ROOT$ORCHESTRA_ROOT" "$RPATH_PLACEHOLDER" "$ORCHESTRA_ROOT"')
-
-    def _replace_ndebug(self, disable_debugging):
-        debug, ndebug = ("0", "1") if disable_debugging else ("1", "0")
-        patch_ndebug_script = dedent(
-            rf"""
-            cd "$TMP_ROOT$ORCHESTRA_ROOT"
-            find include/ -name "*.h" \
-                -exec \
-                    sed -i \
-                    -e 's|^\s*#\s*ifndef\s\+NDEBUG|#if {debug}|' \
-                    -e 's|^\s*#\s*ifdef\s\+NDEBUG|#if {ndebug}|' \
-                    -e 's|^\(\s*#\s*if\s\+.*\)!defined(NDEBUG)|\1{debug}|' \
-                    -e 's|^\(\s*#\s*if\s\+.*\)defined(NDEBUG)|\1{ndebug}|' \
-                    {{}} ';'
-            """
-        )
-        self._run_internal_script(patch_ndebug_script)
-
-    def _replace_asan(self, asan_enabled):
-        replace_with = "1" if asan_enabled else "0"
-        # fmt: off
-        patch_ndebug_script = dedent(rf"""
-            cd "$TMP_ROOT$ORCHESTRA_ROOT"
-            find include/ -name "*.h" \
-                -exec \
-                    sed -i \
-                    -e 's|__has_feature\(address_sanitizer\)|{replace_with}|' \
-                    -e 's|defined\(__SANITIZE_ADDRESS__\)|{replace_with}|' \
-                    {{}} ';'
-            """)
-        # fmt: on
-        self._run_internal_script(patch_ndebug_script)
-
-    def _merge(self):
-        copy_command = f'cp -far --reflink=auto "$TMP_ROOT/$ORCHESTRA_ROOT/." "$ORCHESTRA_ROOT"'
-        self._run_internal_script(copy_command)
 
     def _create_binary_archive(self):
         if self.binary_archive_exists():
@@ -395,17 +458,13 @@ class InstallAction(ActionForBuild):
             self.config.binary_archives_local_paths[binary_archive_repo_name],
             f"_tmp_{self.binary_archive_filename}",
         )
-        script = dedent(
-            f"""
-            mkdir -p "$BINARY_ARCHIVES"
-            cd "$TMP_ROOT$ORCHESTRA_ROOT"
-            rm -f '{absolute_binary_archive_tmp_path}'
-            tar cvaf '{absolute_binary_archive_tmp_path}' --owner=0 --group=0 *
-            mkdir -p '{binary_archive_parent_dir}'
-            mv '{absolute_binary_archive_tmp_path}' '{binary_archive_path}'
-            """
+        os.makedirs(os.path.dirname(absolute_binary_archive_tmp_path), exist_ok=True)
+        create_archive(
+            f'{self.environment["TMP_ROOT"]}{self.environment["ORCHESTRA_ROOT"]}',
+            absolute_binary_archive_tmp_path,
         )
-        self._run_internal_script(script)
+        os.makedirs(binary_archive_parent_dir, exist_ok=True)
+        shutil.move(absolute_binary_archive_tmp_path, binary_archive_path)
         self._save_hash_material()
 
     def _save_hash_material(self):
@@ -415,7 +474,7 @@ class InstallAction(ActionForBuild):
 
     def update_binary_archive_symlink(self):
         """Creates/updates convenience symlinks to the binary archives.
-        Symlinks named <component_branch>_<orchestra_branch>.tar.xz point to the binary archives built for the
+        Symlinks named <component_branch>_<orchestra_branch>.tar.<format> point to the binary archives built for the
         corresponding component and orchestra branches.
         Example: fix-something_master.tar.xz -> abcdef_fedcba.tar.xz would be created if the binary archive
         for component branch fix-something with orchestra configuration on the `master` branch is available.
@@ -440,13 +499,16 @@ class InstallAction(ActionForBuild):
 
         def create_symlink(branch, commit):
             branch = branch.replace("/", "-")
-            target_name = self._binary_archive_filename(commit, self.component.recursive_hash)
-            target_absolute_path = os.path.join(archive_dir_path, target_name)
-            symlink_absolute_path = os.path.join(archive_dir_path, f"{branch}_{orchestra_config_branch}.tar.xz")
-            if os.path.exists(target_absolute_path):
-                if os.path.exists(symlink_absolute_path):
-                    os.unlink(symlink_absolute_path)
-                os.symlink(target_name, symlink_absolute_path)
+            for archive_format in BINARY_ARCHIVES_FORMATS:
+                target_name = self._binary_archive_filename(commit, self.component.recursive_hash, archive_format)
+                target_absolute_path = os.path.join(archive_dir_path, target_name)
+                symlink_absolute_path = os.path.join(
+                    archive_dir_path, f"{branch}_{orchestra_config_branch}.tar.{archive_format}"
+                )
+                if os.path.exists(target_absolute_path):
+                    if os.path.exists(symlink_absolute_path):
+                        os.unlink(symlink_absolute_path)
+                    os.symlink(target_name, symlink_absolute_path)
 
         if self.component.clone:
             for branch, commit in self.component.clone.heads().items():
@@ -454,25 +516,6 @@ class InstallAction(ActionForBuild):
         else:
             create_symlink("none", "none")
 
-    @staticmethod
-    def _index_directory(root_dir_path, relative_to=None):
-        paths = []
-        for current_dir_path, child_dir_names, child_file_names in os.walk(root_dir_path):
-            for child_filename in child_file_names:
-                child_file_path = os.path.join(current_dir_path, child_filename)
-                if relative_to:
-                    child_file_path = os.path.relpath(child_file_path, relative_to)
-                paths.append(child_file_path)
-
-            for child_dir in child_dir_names:
-                child_dir_path = os.path.join(current_dir_path, child_dir)
-                if os.path.islink(child_dir_path):
-                    if relative_to:
-                        child_dir_path = os.path.relpath(child_dir_path, relative_to)
-                    paths.append(child_dir_path)
-
-        return paths
-
     def _cleanup_tmproot(self):
         shutil.rmtree(self.tmp_root, ignore_errors=True)
 
@@ -518,7 +561,17 @@ class InstallAction(ActionForBuild):
         to get a path which is unique to a single build
         """
         component_commit = self.component.commit() or "none"
-        return self._binary_archive_filename(component_commit, self.component.recursive_hash)
+        return self._binary_archive_filename(
+            component_commit, self.component.recursive_hash, self._binary_archive_format
+        )
+
+    @property
+    def _binary_archive_format(self) -> str:
+        """Returns the format of the binary archives created for the target build"""
+        binary_archive_repo_name = self.component.binary_archives or next(
+            iter(self.config.binary_archives_remotes), None
+        )
+        return self.config.binary_archives_formats.get(binary_archive_repo_name, DEFAULT_BINARY_ARCHIVES_FORMAT)
 
     @property
     def binary_archive_relative_dir(self) -> str:
@@ -540,8 +593,8 @@ class InstallAction(ActionForBuild):
         return self._hash_material_filename(component_commit, self.component.recursive_hash)
 
     @staticmethod
-    def _binary_archive_filename(component_commit, component_recursive_hash) -> str:
-        return f"{component_commit}_{component_recursive_hash}.tar.xz"
+    def _binary_archive_filename(component_commit, component_recursive_hash, archive_format) -> str:
+        return f"{component_commit}_{component_recursive_hash}.tar.{archive_format}"
 
     @staticmethod
     def _hash_material_filename(component_commit, component_recursive_hash) -> str:
@@ -583,7 +636,7 @@ class InstallAction(ActionForBuild):
         binary_archives_path = self.config.binary_archives_dir
         for name in self.config.binary_archives_remotes:
             relative_path_without_extension = os.path.splitext(self.binary_archive_relative_path)[0]
-            extensions = [".xz", ".gz", ""]
+            extensions = [".xz", ".zst", ".gz", ""]
             for extension in extensions:
                 try_path = os.path.join(binary_archives_path, name, relative_path_without_extension + extension)
                 if os.path.exists(try_path):
@@ -600,6 +653,26 @@ class InstallAction(ActionForBuild):
         env["DESTDIR"] = self.tmp_root
         return env
 
+    @property
+    def installs_from_binary_archive(self) -> bool:
+        """Returns True if the action will install the build from a binary archive"""
+        return self.allow_binary_archive and self.binary_archive_exists()
+
+    @property
+    def resources(self):
+        # Installing from binary archives has negligible requirements compared to building
+        if self.installs_from_binary_archive:
+            return {}
+        return self.build.resources
+
+    @property
+    def estimated_duration(self):
+        # Use the time it took to install the component the last time, if known
+        metadata = load_metadata(self.component.name, self.config)
+        if metadata is None:
+            return None
+        return metadata.install_time
+
     @property
     def architecture(self):
         return "linux-x86-64"
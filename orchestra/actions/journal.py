@@ -0,0 +1,78 @@
+import os
+import shutil
+
+
+class Journal:
+    """Records the changes made to the files in a directory, so that they can be undone by `rollback_journal` if the
+    process making them is interrupted.
+    Paths are recorded before being created. Paths which are going to be replaced or removed are first hardlinked into
+    a backup directory next to the journal (on the same filesystem, as the journal is kept in the orchestra root), so
+    that their previous version can be restored.
+    """
+
+    def __init__(self, journal_path: str, root: str):
+        self.path = journal_path
+        self.root = root
+        self.backup_dir = journal_backup_dir(journal_path)
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        self._file = open(journal_path, "w")
+
+    def created(self, name: str):
+        """Records that the path name (relative to root), which does not exist yet, is going to be created"""
+        self._write(f"+ {name}")
+
+    def backup(self, name: str):
+        """Saves the current version of the path name (relative to root), which is going to be replaced or removed"""
+        backup_path = os.path.join(self.backup_dir, name)
+        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+        if os.path.lexists(backup_path):
+            os.remove(backup_path)
+        os.link(os.path.join(self.root, name), backup_path, follow_symlinks=False)
+        self._write(f"~ {name}")
+
+    def close(self):
+        self._file.close()
+
+    def commit(self):
+        """Makes the recorded changes permanent, deleting the journal and the backups"""
+        self.close()
+        os.remove(self.path)
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+
+    def _write(self, line: str):
+        self._file.write(f"{line}\n")
+        self._file.flush()
+
+
+def journal_backup_dir(journal_path: str) -> str:
+    """Returns the directory containing the backups of the files recorded in a journal"""
+    return journal_path + ".backup"
+
+
+def rollback_journal(journal_path: str, root: str):
+    """Undoes the changes recorded in a journal: created paths are removed and the replaced or removed ones are restored
+    from their backups. The journal and the backups are deleted afterwards.
+    """
+    with open(journal_path) as journal:
+        # The last line might have been only partially written
+        lines = journal.read().split("\n")[:-1]
+
+    backup_dir = journal_backup_dir(journal_path)
+    # Reverse order removes the content of the directories before the directories themselves
+    for line in reversed(lines):
+        operation, name = line[:2], line[2:]
+        path = os.path.join(root, name)
+        if operation == "~ ":
+            backup_path = os.path.join(backup_dir, name)
+            if os.path.lexists(backup_path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(backup_path, path)
+        elif os.path.isdir(path) and not os.path.islink(path):
+            if not any(os.scandir(path)):
+                os.rmdir(path)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+    os.remove(journal_path)
+    shutil.rmtree(backup_dir, ignore_errors=True)
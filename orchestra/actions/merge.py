@@ -0,0 +1,284 @@
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from ..exceptions import UserException
+
+# ioctl request cloning the content of a file into another one on copy-on-write filesystems (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+_COMPARE_CHUNK_SIZE = 1024 * 1024
+
+# Size in bytes of the BLAKE2b digests recorded in the manifests
+_DIGEST_SIZE = 16
+
+# (size, mode, hex digest of the content or of the symlink target)
+ManifestEntry = Tuple[int, int, str]
+
+
+class MergeStatistics:
+    """Counts of the files handled by `merge_directory`"""
+
+    def __init__(self):
+        # Files and directories renamed from the source into the destination
+        self.moved = 0
+        # Files copied (or reflinked) because source and destination are on different filesystems
+        self.copied = 0
+        # Files left untouched because the destination already had the same content
+        self.unchanged = 0
+
+
+def merge_directory(
+    source_root: str,
+    destination_root: str,
+    move: bool = True,
+    manifest: Optional[Dict[str, ManifestEntry]] = None,
+) -> MergeStatistics:
+    """Merges the content of source_root into destination_root, like `cp -far source_root/. destination_root`.
+    Files are renamed into place if move is True and both directories are on the same filesystem, otherwise they are
+    reflinked or copied to a temporary file next to the destination and renamed over it. Either way each file is
+    replaced atomically, so processes using destination_root never observe missing or partially written files.
+    Files whose destination has the same mode and content are left untouched, preserving their mtime.
+    :param manifest: if not None, the `manifest_entry` of each merged file is added to it, indexed by the path
+                     relative to destination_root
+    """
+    merger = _Merger(move, manifest)
+    os.makedirs(destination_root, exist_ok=True)
+    merger.merge_directory(source_root, destination_root, "")
+    return merger.statistics
+
+
+def manifest_entry(
+    path: str, info: Optional[os.stat_result] = None, content_digest: Optional[str] = None
+) -> ManifestEntry:
+    """Returns size, mode and BLAKE2b digest of a file (or of the target of a symlink).
+    The content is read only if content_digest, the hex digest computed while the file was written, is not passed.
+    """
+    info = info or os.lstat(path)
+    if content_digest is None:
+        digest = new_content_digest()
+        if stat.S_ISLNK(info.st_mode):
+            digest.update(os.fsencode(os.readlink(path)))
+        else:
+            with open(path, "rb") as f:
+                _update_digest(digest, f)
+        content_digest = digest.hexdigest()
+    return info.st_size, info.st_mode, content_digest
+
+
+def new_content_digest():
+    """Returns a hash object computing the content digests recorded by `manifest_entry`"""
+    return hashlib.blake2b(digest_size=_DIGEST_SIZE)
+
+
+class _Merger:
+    def __init__(self, move: bool, manifest: Optional[Dict[str, ManifestEntry]]):
+        self.move = move
+        self.manifest = manifest
+        self.statistics = MergeStatistics()
+        # (st_dev, st_ino) of the source files with multiple links -> the path of their first copy, so that hardlinks
+        # are preserved when copying
+        self.copied_hardlinks: Dict[Tuple[int, int], str] = {}
+
+    def merge_directory(self, source_dir: str, destination_dir: str, relative_dir: str):
+        with os.scandir(source_dir) as entries:
+            entries = list(entries)
+
+        for entry in entries:
+            destination = os.path.join(destination_dir, entry.name)
+            relative_path = os.path.join(relative_dir, entry.name)
+            try:
+                destination_info = os.lstat(destination)
+            except FileNotFoundError:
+                destination_info = None
+
+            if entry.is_dir(follow_symlinks=False):
+                self._merge_subdirectory(entry, destination, destination_info, relative_path)
+                continue
+
+            if not entry.is_file(follow_symlinks=False) and not entry.is_symlink():
+                logger.warning(f"Not merging {entry.path}: unsupported file type")
+                continue
+
+            if destination_info is not None and stat.S_ISDIR(destination_info.st_mode):
+                raise UserException(f"Cannot overwrite directory {destination} with non-directory {entry.path}")
+
+            # The content of the compared or copied files is hashed as it is read, the renamed ones have to be read
+            digest = new_content_digest() if self.manifest is not None else None
+            if destination_info is not None and same_content(
+                entry.path, destination, entry.stat(follow_symlinks=False), destination_info, digest
+            ):
+                self.statistics.unchanged += 1
+                content_digest = digest.hexdigest() if digest is not None else None
+            else:
+                content_digest = self._replace(entry, destination)
+
+            if self.manifest is not None:
+                self.manifest[relative_path] = manifest_entry(destination, content_digest=content_digest)
+
+    def _merge_subdirectory(self, entry: os.DirEntry, destination: str, destination_info, relative_path: str):
+        # Like cp, symlinks to directories in the destination are treated as directories
+        if destination_info is not None and os.path.isdir(destination):
+            self.merge_directory(entry.path, destination, relative_path)
+            return
+
+        if destination_info is not None:
+            os.remove(destination)
+
+        if self.move and self._try_rename(entry.path, destination):
+            if self.manifest is not None:
+                self._add_directory_to_manifest(destination, relative_path)
+            return
+
+        # The directory might have been created in the meantime by a concurrent install, in which case the content is
+        # merged into it
+        os.makedirs(destination, exist_ok=True)
+        self.merge_directory(entry.path, destination, relative_path)
+        shutil.copystat(entry.path, destination, follow_symlinks=False)
+
+    def _add_directory_to_manifest(self, directory: str, relative_dir: str):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    self._add_directory_to_manifest(entry.path, relative_path)
+                elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                    self.manifest[relative_path] = manifest_entry(entry.path, entry.stat(follow_symlinks=False))
+
+    def _replace(self, entry: os.DirEntry, destination: str) -> Optional[str]:
+        """Replaces destination with the source entry. Returns the hex digest of the content if it was copied and a
+        manifest is being recorded, None otherwise
+        """
+        if self.move and self._try_rename(entry.path, destination):
+            return None
+
+        temporary_path = os.path.join(os.path.dirname(destination), f".{entry.name}.orchestra-tmp")
+        # A concurrent uninstall might have removed the destination directory once it became empty
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.lexists(temporary_path):
+            os.remove(temporary_path)
+
+        info = entry.stat(follow_symlinks=False)
+        digest = None
+        if entry.is_symlink():
+            os.symlink(os.readlink(entry.path), temporary_path)
+        elif info.st_nlink > 1 and (info.st_dev, info.st_ino) in self.copied_hardlinks:
+            os.link(self.copied_hardlinks[(info.st_dev, info.st_ino)], temporary_path)
+        else:
+            digest = new_content_digest() if self.manifest is not None else None
+            _copy_file(entry.path, temporary_path, digest)
+            if info.st_nlink > 1:
+                self.copied_hardlinks[(info.st_dev, info.st_ino)] = destination
+
+        if not entry.is_symlink():
+            shutil.copystat(entry.path, temporary_path)
+        _rename_over(temporary_path, destination)
+        self.statistics.copied += 1
+        return digest.hexdigest() if digest is not None else None
+
+    def _try_rename(self, source: str, destination: str) -> bool:
+        """Renames source over destination, returns False if they are on different filesystems or if destination is a
+        non-empty directory (created by a concurrent install after it was checked)
+        """
+        try:
+            _rename_over(source, destination)
+        except OSError as e:
+            if e.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                return False
+            if e.errno != errno.EXDEV:
+                raise
+            # No point in trying again for the following files
+            self.move = False
+            return False
+
+        self.statistics.moved += 1
+        return True
+
+
+def same_content(
+    source: str,
+    destination: str,
+    source_info: Optional[os.stat_result] = None,
+    destination_info: Optional[os.stat_result] = None,
+    digest=None,
+) -> bool:
+    """Returns True if source and destination have the same mode and content (or target, for symlinks).
+    The lstat results of the two paths can be passed if already available.
+    If digest (see `new_content_digest`) is not None and True is returned, it has been updated with the content of
+    source (or its target), otherwise its state is unspecified.
+    """
+    info = source_info or os.lstat(source)
+    destination_info = destination_info or os.lstat(destination)
+    if info.st_mode != destination_info.st_mode:
+        return False
+
+    if stat.S_ISLNK(info.st_mode):
+        target = os.readlink(source)
+        if digest is not None:
+            digest.update(os.fsencode(target))
+        return target == os.readlink(destination)
+
+    if info.st_size != destination_info.st_size:
+        return False
+
+    if info.st_dev == destination_info.st_dev and info.st_ino == destination_info.st_ino:
+        if digest is not None:
+            with open(source, "rb") as source_file:
+                _update_digest(digest, source_file)
+        return True
+
+    with open(source, "rb") as source_file, open(destination, "rb") as destination_file:
+        while True:
+            source_chunk = source_file.read(_COMPARE_CHUNK_SIZE)
+            if source_chunk != destination_file.read(_COMPARE_CHUNK_SIZE):
+                return False
+            if not source_chunk:
+                return True
+            if digest is not None:
+                digest.update(source_chunk)
+
+
+def _rename_over(source: str, destination: str):
+    """Like os.replace, but recreates the directory containing destination if a concurrent uninstall removed it"""
+    try:
+        os.replace(source, destination)
+    except FileNotFoundError:
+        if not os.path.lexists(source):
+            raise
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(source, destination)
+
+
+def _copy_file(source: str, destination: str, digest=None):
+    """Copies the content of source to destination, sharing the data blocks if the filesystem supports reflinks.
+    If digest is not None it is updated with the content, which is then read and written in chunks.
+    """
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+        except OSError:
+            pass
+        else:
+            if digest is not None:
+                _update_digest(digest, source_file)
+            return
+
+        if digest is not None:
+            for chunk in iter(lambda: source_file.read(_COMPARE_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                destination_file.write(chunk)
+            return
+
+    # Uses sendfile on Linux
+    shutil.copyfile(source, destination)
+
+
+def _update_digest(digest, file):
+    for chunk in iter(lambda: file.read(_COMPARE_CHUNK_SIZE), b""):
+        digest.update(chunk)
@@ -0,0 +1,229 @@
+import mmap
+import os
+import re
+import stat
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .directory_index import scan_directory
+from ..support.elf_replace_dynstr import replace_dynstr
+
+# Equivalent of sed's \s, which never matches the newline terminating a line
+_BLANK = rb"[^\S\n]"
+
+_IFNDEF_NDEBUG = re.compile(rb"^" + _BLANK + rb"*#" + _BLANK + rb"*ifndef" + _BLANK + rb"+NDEBUG", re.MULTILINE)
+_IFDEF_NDEBUG = re.compile(rb"^" + _BLANK + rb"*#" + _BLANK + rb"*ifdef" + _BLANK + rb"+NDEBUG", re.MULTILINE)
+_IF_NOT_DEFINED_NDEBUG = re.compile(
+    rb"^(" + _BLANK + rb"*#" + _BLANK + rb"*if" + _BLANK + rb"+.*)!defined\(NDEBUG\)", re.MULTILINE
+)
+_IF_DEFINED_NDEBUG = re.compile(
+    rb"^(" + _BLANK + rb"*#" + _BLANK + rb"*if" + _BLANK + rb"+.*)defined\(NDEBUG\)", re.MULTILINE
+)
+
+_HAS_FEATURE_ASAN = re.compile(rb"__has_feature\(address_sanitizer\)")
+_DEFINED_SANITIZE_ADDRESS = re.compile(rb"defined\(__SANITIZE_ADDRESS__\)")
+
+# Headers not containing any of these strings cannot match any of the header substitutions
+_HEADER_TOKENS = (b"NDEBUG", b"address_sanitizer", b"__SANITIZE_ADDRESS__")
+
+
+class _TmprootFiles:
+    """The files found in the temporary root, classified according to the post-install steps they need"""
+
+    def __init__(self):
+        # Paths relative to the temporary root of all the entries which are not directories
+        self.index: Set[str] = set()
+        # path -> (atime_ns, mtime_ns) for all the regular files
+        self.times: Dict[str, Tuple[int, int]] = {}
+        self.libtool_files: List[str] = []
+        # inode -> paths of the regular files with more than one link
+        self.hardlinks: Dict[int, List[str]] = defaultdict(list)
+        self.pkgconfig_files: List[str] = []
+        self.headers: List[str] = []
+        # Regular files which might be ELFs
+        self.other_files: List[str] = []
+
+
+def post_install(
+    root: str,
+    orchestra_root: str,
+    *,
+    ndebug: bool,
+    asan: bool,
+    rpath_search_strings: List[str],
+    jobs: Optional[int] = None,
+) -> Set[str]:
+    """Applies the post-install transformations to the files installed in a temporary root.
+    The temporary root is walked only once, the files which have to be rewritten are then processed by a thread pool
+    (see `FileRewriter`).
+    Returns the paths relative to root of the installed files, symlinks included, as `index_directory` would.
+    :param root: path of the orchestra root inside the temporary root
+    :param orchestra_root: path of the orchestra root, which has to be dropped from the pkg-config files
+    :param ndebug: whether NDEBUG checks in headers should be replaced as if NDEBUG was defined
+    :param asan: whether ASAN checks in headers should be replaced as if ASAN was enabled
+    :param rpath_search_strings: strings to be replaced with paths relative to $ORIGIN in the ELFs' .dynstr
+    :param jobs: maximum number of files rewritten concurrently (defaults to the number of CPUs)
+    """
+    logger.debug("Classifying tmproot files")
+    files = _classify_files(root)
+
+    logger.debug("Purging libtools' files")
+    for path in files.libtool_files:
+        os.remove(path)
+        files.index.discard(os.path.relpath(path, root))
+
+    # TODO: maybe this should be put into the configuration and not in orchestra itself
+    logger.debug("Converting hardlinks to symbolic")
+    replaced_paths = _hard_to_symbolic(files.hardlinks)
+
+    # TODO: maybe this should be put into the configuration and not in orchestra itself
+    logger.debug("Fixing RPATHs")
+    patched_elfs = replace_dynstr(
+        [path for path in files.other_files if path not in replaced_paths],
+        root,
+        [search_string.encode("utf-8") for search_string in rpath_search_strings],
+        jobs=jobs,
+    )
+    logger.debug(f"Patched {len(patched_elfs)} ELF files")
+
+    logger.debug("Dropping absolute paths from pkg-config")
+    orchestra_root = orchestra_root.encode("utf-8")
+    pkgconfig_rewriter = FileRewriter(
+        [(re.compile(rb"/*" + re.escape(orchestra_root) + rb"/*"), rb"${pcfiledir}/../..")],
+        tokens=[orchestra_root],
+    )
+    # TODO: this should be put into the configuration and not in orchestra itself
+    logger.debug("Replacing NDEBUG and ASAN preprocessor statements")
+    header_rewriter = FileRewriter(_header_substitutions(ndebug, asan), tokens=_HEADER_TOKENS)
+
+    pkgconfig_files = [path for path in files.pkgconfig_files if path not in replaced_paths]
+    headers = [path for path in files.headers if path not in replaced_paths]
+    with ThreadPoolExecutor(max_workers=jobs) as workers:
+        # list() propagates exceptions raised by the workers
+        changed_pkgconfig_files = list(workers.map(pkgconfig_rewriter.rewrite, pkgconfig_files))
+        changed_headers = list(workers.map(header_rewriter.rewrite, headers))
+    logger.debug(f"Scanned {len(pkgconfig_files)} pkg-config files, changed {sum(changed_pkgconfig_files)}")
+    logger.debug(f"Scanned {len(headers)} headers, changed {sum(changed_headers)}")
+
+    logger.debug("Restoring tmproot files timestamps")
+    for path, times in files.times.items():
+        if os.path.exists(path):
+            os.utime(path, times=None, ns=times)
+
+    return files.index
+
+
+def _classify_files(root: str) -> _TmprootFiles:
+    files = _TmprootFiles()
+    pkgconfig_dir = os.path.realpath(os.path.join(root, "lib", "pkgconfig"))
+    include_dir = os.path.realpath(os.path.join(root, "include"))
+
+    for relative_dir_path, dir_path, entries in scan_directory(root):
+        real_dir_path = os.path.realpath(dir_path)
+        in_pkgconfig_dir = _is_subpath(real_dir_path, pkgconfig_dir)
+        in_include_dir = _is_subpath(real_dir_path, include_dir)
+
+        for entry in entries:
+            files.index.add(os.path.join(relative_dir_path, entry.name))
+            if not entry.is_file(follow_symlinks=False):
+                continue
+
+            path = entry.path
+            if entry.name.endswith(".la"):
+                files.libtool_files.append(path)
+                continue
+
+            info = entry.stat(follow_symlinks=False)
+            files.times[path] = (info.st_atime_ns, info.st_mtime_ns)
+
+            if info.st_ino != 0 and info.st_nlink >= 2:
+                files.hardlinks[info.st_ino].append(path)
+
+            if in_pkgconfig_dir and entry.name.endswith(".pc"):
+                files.pkgconfig_files.append(path)
+            elif in_include_dir and entry.name.endswith(".h"):
+                files.headers.append(path)
+            else:
+                files.other_files.append(path)
+
+    return files
+
+
+def _is_subpath(path: str, directory: str) -> bool:
+    return path == directory or path.startswith(directory + os.sep)
+
+
+def _hard_to_symbolic(hardlinks: Dict[int, List[str]]) -> set:
+    """Replaces all but one of the paths of each hardlinked file with symbolic links.
+    Returns the replaced paths.
+    """
+    replaced_paths = set()
+    for equivalent in hardlinks.values():
+        base = equivalent.pop()
+        for alternative in equivalent:
+            os.unlink(alternative)
+            os.symlink(os.path.relpath(base, os.path.dirname(alternative)), alternative)
+            replaced_paths.add(alternative)
+    return replaced_paths
+
+
+def _header_substitutions(ndebug: bool, asan: bool) -> List[Tuple["re.Pattern", bytes]]:
+    debug, ndebug = (b"0", b"1") if ndebug else (b"1", b"0")
+    asan = b"1" if asan else b"0"
+    return [
+        (_IFNDEF_NDEBUG, b"#if " + debug),
+        (_IFDEF_NDEBUG, b"#if " + ndebug),
+        (_IF_NOT_DEFINED_NDEBUG, rb"\g<1>" + debug),
+        (_IF_DEFINED_NDEBUG, rb"\g<1>" + ndebug),
+        (_HAS_FEATURE_ASAN, asan),
+        (_DEFINED_SANITIZE_ADDRESS, asan),
+    ]
+
+
+class FileRewriter:
+    """Applies a list of regular expression substitutions to files.
+    Files are memory-mapped and searched for the trigger tokens first: the substitutions are applied only if at least
+    one of them is found, and the file is written back only if its content changed.
+    """
+
+    def __init__(self, substitutions: List[Tuple["re.Pattern", bytes]], tokens: Iterable[bytes]):
+        self.substitutions = substitutions
+        self.tokens = list(tokens)
+
+    def rewrite(self, path: str) -> bool:
+        """Rewrites a file, returns True if it was changed.
+        Like `sed -i`, the new content is written to a temporary file which then replaces the original one, so that
+        read-only files can be rewritten and an interruption never leaves a truncated file.
+        """
+        with open(path, "rb") as f:
+            info = os.fstat(f.fileno())
+            # Empty files cannot be memory-mapped, and they would not be changed anyway
+            if info.st_size == 0:
+                return False
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                if not any(mapped_file.find(token) != -1 for token in self.tokens):
+                    return False
+                original = mapped_file[:]
+
+        new = original
+        for pattern, replacement in self.substitutions:
+            new = pattern.sub(replacement, new)
+
+        if new == original:
+            return False
+
+        temporary_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.orchestra-tmp")
+        try:
+            with open(temporary_path, "wb") as f:
+                f.write(new)
+                os.fchmod(f.fileno(), stat.S_IMODE(info.st_mode))
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.lexists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return True
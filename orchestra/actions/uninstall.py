@@ -1,3 +1,4 @@
+import errno
 import os
 import stat
 
@@ -5,20 +6,25 @@ from loguru import logger
 
 from ..model.install_metadata import (
     load_file_list,
-    installed_component_file_list_path,
-    installed_component_metadata_path,
+    remove_file_list,
+    remove_manifest,
+    remove_metadata,
+    metadata_file_paths,
 )
 
 
-def uninstall(component_name, config):
-    index_path = installed_component_file_list_path(component_name, config)
-    metadata_path = installed_component_metadata_path(component_name, config)
+def uninstall(component_name, config, keep=(), backup=None):
+    """Removes the files installed by a component and its metadata.
+    :param keep: paths relative to the root which are not removed, used when a new build of the component has already
+                 been merged in the root
+    :param backup: if not None, called with the path relative to the root of each file before removing it
+    """
+    keep = set(keep)
 
     # Index and metadata files should be removed last,
     # so an interrupted uninstall can be resumed
     postpone_removal_paths = [
-        os.path.relpath(index_path, config.orchestra_root),
-        os.path.relpath(metadata_path, config.orchestra_root),
+        os.path.relpath(path, config.orchestra_root) for path in metadata_file_paths(component_name, config)
     ]
 
     paths = load_file_list(component_name, config)
@@ -33,7 +39,7 @@ def uninstall(component_name, config):
         # Ensure the path is relative to the root
         path = path.lstrip("/")
 
-        if path in postpone_removal_paths:
+        if path in postpone_removal_paths or path in keep:
             continue
 
         path_to_delete = os.path.join(orchestra_root, path)
@@ -45,22 +51,37 @@ def uninstall(component_name, config):
 
         if stat.S_ISREG(stat_mode) or stat.S_ISLNK(stat_mode):
             logger.debug(f"Deleting {path_to_delete}")
+            if backup is not None:
+                backup(path)
             os.remove(path_to_delete)
         elif stat.S_ISDIR(stat_mode):
             if os.listdir(path_to_delete):
                 logger.debug(f"Not removing directory {path_to_delete} as it is not empty")
             else:
                 logger.debug(f"Deleting directory {path_to_delete}")
-                os.rmdir(path_to_delete)
+                _remove_empty_directory(path_to_delete)
 
         containing_directory = os.path.dirname(path_to_delete)
         # not any(scandir(path)) is a fast way to tell if a directory is empty
         if os.path.exists(containing_directory) and not any(os.scandir(containing_directory)):
             logger.debug(f"Removing empty directory {containing_directory}")
-            os.rmdir(containing_directory)
+            _remove_empty_directory(containing_directory)
 
-    logger.debug(f"Deleting index file {index_path}")
-    os.remove(index_path)
+    logger.debug(f"Deleting index of {component_name}")
+    remove_file_list(component_name, config)
 
-    logger.debug(f"Deleting metadata file {metadata_path}")
-    os.remove(metadata_path)
+    logger.debug(f"Deleting manifest of {component_name}")
+    remove_manifest(component_name, config)
+
+    logger.debug(f"Deleting metadata of {component_name}")
+    remove_metadata(component_name, config)
+
+
+def _remove_empty_directory(path):
+    """Removes a directory, unless a concurrent install has put files into it (or removed it) after it was checked"""
+    try:
+        os.rmdir(path)
+    except OSError as e:
+        if e.errno not in (errno.ENOTEMPTY, errno.EEXIST, errno.ENOENT):
+            raise
+        logger.debug(f"Not removing directory {path} as it is not empty anymore")
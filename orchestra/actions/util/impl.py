@@ -22,6 +22,7 @@ def _run_script(
     loglevel="INFO",
     stdout=None,
     stderr=None,
+    pass_fds=(),
 ):
     """Helper for running shell scripts.
     :param script: the script to run
@@ -31,6 +32,7 @@ def _run_script(
     :param loglevel: log debug informations at this level
     :param stdout: passed as the "stdout" parameter to subprocess.run
     :param stderr: passed as the "stderr" parameter to subprocess.run
+    :param pass_fds: file descriptors inherited by the script, passed as the "pass_fds" parameter to subprocess.run
     :return: a subprocess.CompletedProcess instance
     """
     if strict_flags:
@@ -44,7 +46,13 @@ def _run_script(
     script_to_run += script
 
     logger.log(loglevel, f"The following script is going to be executed:\n" + script.strip())
-    return subprocess.run(["/bin/bash", "-c", script_to_run], stdout=stdout, stderr=stderr, cwd=cwd)
+    return subprocess.run(
+        ["/bin/bash", "-c", script_to_run],
+        stdout=stdout,
+        stderr=stderr,
+        cwd=cwd,
+        pass_fds=pass_fds,
+    )
 
 
 def _run_internal_script(script, environment: OrderedDict = None, check_returncode=True, cwd=None):
@@ -94,6 +102,9 @@ def _run_user_script(script, environment: OrderedDict = None, check_returncode=T
         stdout = None
         stderr = None
 
+    # User scripts can use the jobserver advertised in MAKEFLAGS, so they need to inherit its file descriptors
+    pass_fds = globals.jobserver.fds if globals.jobserver is not None else ()
+
     result = _run_script(
         script,
         environment=environment,
@@ -101,6 +112,7 @@ def _run_user_script(script, environment: OrderedDict = None, check_returncode=T
         stdout=stdout,
         stderr=stderr,
         cwd=cwd,
+        pass_fds=pass_fds,
     )
 
     if check_returncode and result.returncode != 0:
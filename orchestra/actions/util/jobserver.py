@@ -0,0 +1,63 @@
+import os
+
+from loguru import logger
+
+from ...exceptions import InternalException
+
+
+class JobServer:
+    """A GNU make jobserver shared by all the user scripts run by orchestra.
+
+    The jobserver is a pipe holding one byte (token) for each job that can be started in addition to the one each make
+    instance is implicitly allowed to run. make (and other jobserver-aware tools) find the pipe file descriptors in
+    MAKEFLAGS and acquire a token before starting an additional job, releasing it once the job terminates.
+    This way the number of jobs started by all the concurrently running scripts is bounded by the number of tokens
+    (plus one implicit job for each running script).
+    """
+
+    def __init__(self, tokens):
+        if tokens < 1:
+            raise InternalException(f"A jobserver needs at least one token (got {tokens})")
+
+        self.tokens = tokens
+        self._read_fd = None
+        self._write_fd = None
+
+    def start(self):
+        if self._read_fd is not None:
+            raise InternalException("Jobserver already started")
+
+        logger.debug(f"Starting jobserver with {self.tokens} tokens")
+        self._read_fd, self._write_fd = os.pipe()
+        # Every client owns an implicit token, so only the additional ones are put in the pipe
+        os.write(self._write_fd, b"+" * (self.tokens - 1))
+
+    def stop(self):
+        if self._read_fd is None:
+            return
+
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+        self._read_fd = None
+        self._write_fd = None
+
+    @property
+    def fds(self):
+        """Returns the file descriptors that have to be inherited by the processes using the jobserver"""
+        if self._read_fd is None:
+            return ()
+        return self._read_fd, self._write_fd
+
+    @property
+    def makeflags(self):
+        """Returns the value of MAKEFLAGS which instructs make to use this jobserver"""
+        if self._read_fd is None:
+            raise InternalException("Jobserver not started")
+        return f"-j{self.tokens} --jobserver-auth={self._read_fd},{self._write_fd}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -1,7 +1,7 @@
 from loguru import logger
 
 from . import SubCommandParser
-from .common import execution_options
+from .common import execution_options, parallel_execution_options, resource_capacity, solver_options
 from ..executor import Executor
 from ..model.configuration import Configuration
 
@@ -11,7 +11,7 @@ def install_subcommand(sub_argparser: SubCommandParser):
         "clone",
         handler=handle_clone,
         help="Clone a component",
-        parents=[execution_options],
+        parents=[execution_options, parallel_execution_options, solver_options],
     )
     cmd_parser.add_argument("components", nargs="+", help="Name of the components to clone")
     cmd_parser.add_argument("--no-force", action="store_true", help="Don't force execution of the root action")
@@ -34,7 +34,16 @@ def handle_clone(args):
 
         actions.add(build.component.clone)
 
-    executor = Executor(actions, no_force=args.no_force, pretend=args.pretend)
+    executor = Executor(
+        actions,
+        no_force=args.no_force,
+        pretend=args.pretend,
+        jobs=args.jobs,
+        make_jobs=args.make_jobs,
+        resource_capacity=resource_capacity(args),
+        prefetch_jobs=args.prefetch_jobs,
+        solver=args.solver,
+    )
     failed = executor.run()
     exitcode = 1 if failed else 0
     return exitcode
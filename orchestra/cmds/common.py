@@ -1,6 +1,9 @@
 import argparse
 
+from ..executor import SOLVERS, default_resource_capacity
+
 LFS_RETRIES_DEFAULT = 3
+PREFETCH_JOBS_DEFAULT = 4
 
 build_options = argparse.ArgumentParser(add_help=False)
 build_group = build_options.add_argument_group(title="Build options")
@@ -35,3 +38,73 @@ execution_group.add_argument(
     default=LFS_RETRIES_DEFAULT,
     help=f"Retry fetching binary archives up to N times before giving up. Defaults to {LFS_RETRIES_DEFAULT}",
 )
+
+solver_options = argparse.ArgumentParser(add_help=False)
+solver_group = solver_options.add_argument_group(title="Dependency solver options")
+solver_group.add_argument(
+    "--solver",
+    choices=SOLVERS,
+    default=SOLVERS[0],
+    help=f"Algorithm used to choose between alternative dependencies. Defaults to {SOLVERS[0]}",
+)
+
+parallel_execution_options = argparse.ArgumentParser(add_help=False)
+parallel_execution_group = parallel_execution_options.add_argument_group(title="Parallel execution options")
+parallel_execution_group.add_argument(
+    "--jobs",
+    "-j",
+    metavar="N",
+    type=int,
+    default=1,
+    help="Run up to N independent actions at the same time. Defaults to 1",
+)
+parallel_execution_group.add_argument(
+    "--make-jobs",
+    metavar="N",
+    type=int,
+    help="Share N jobs between all the running scripts using a GNU make jobserver (advertised through MAKEFLAGS). "
+    "Defaults to the number of CPUs when running more than one action at the same time",
+)
+parallel_execution_group.add_argument(
+    "--prefetch-jobs",
+    metavar="N",
+    type=int,
+    default=PREFETCH_JOBS_DEFAULT,
+    help="Download binary archives in the background before they are needed, transferring up to N archives at the "
+    f"same time. 0 disables prefetching. Defaults to {PREFETCH_JOBS_DEFAULT}",
+)
+parallel_execution_group.add_argument(
+    "--max-cpu",
+    metavar="N",
+    type=float,
+    help="Do not run at the same time actions requiring more than N CPUs in total (see build `resources`). "
+    "Defaults to the number of CPUs",
+)
+parallel_execution_group.add_argument(
+    "--max-memory",
+    metavar="GIB",
+    type=float,
+    help="Do not run at the same time actions requiring more than GIB GiB of memory in total (see build `resources`). "
+    "Defaults to the amount of memory of the machine",
+)
+parallel_execution_group.add_argument(
+    "--max-disk-io",
+    metavar="N",
+    type=float,
+    help="Do not run at the same time actions requiring more than N units of disk I/O in total "
+    "(see build `resources`). Unlimited by default",
+)
+
+
+def resource_capacity(args):
+    """Returns the resource capacity to pass to the Executor, applying the overrides specified on the command line"""
+    capacity = default_resource_capacity()
+    overrides = {
+        "cpu": args.max_cpu,
+        "memory": args.max_memory,
+        "disk_io": args.max_disk_io,
+    }
+    for resource, amount in overrides.items():
+        if amount is not None:
+            capacity[resource] = amount
+    return capacity
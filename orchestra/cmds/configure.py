@@ -1,7 +1,7 @@
 from loguru import logger
 
 from . import SubCommandParser
-from .common import execution_options, build_options
+from .common import execution_options, build_options, parallel_execution_options, resource_capacity, solver_options
 from ..executor import Executor
 from ..gitutils.lfs import assert_lfs_installed
 from ..model.configuration import Configuration
@@ -12,7 +12,7 @@ def install_subcommand(sub_argparser: SubCommandParser):
         "configure",
         handler=handle_configure,
         help="Run configure script",
-        parents=[execution_options, build_options],
+        parents=[execution_options, build_options, parallel_execution_options, solver_options],
     )
     cmd_parser.add_argument("components", nargs="+", help="Name of the components to configure")
     cmd_parser.add_argument("--no-force", action="store_true", help="Don't force execution of the root action")
@@ -42,7 +42,17 @@ def handle_configure(args):
 
         actions.add(build.configure)
 
-    executor = Executor(actions, no_deps=args.no_deps, no_force=args.no_force, pretend=args.pretend)
+    executor = Executor(
+        actions,
+        no_deps=args.no_deps,
+        no_force=args.no_force,
+        pretend=args.pretend,
+        jobs=args.jobs,
+        make_jobs=args.make_jobs,
+        resource_capacity=resource_capacity(args),
+        prefetch_jobs=args.prefetch_jobs,
+        solver=args.solver,
+    )
 
     failed = executor.run()
     exitcode = 1 if failed else 0
@@ -2,7 +2,7 @@ import networkx as nx
 from loguru import logger
 
 from . import SubCommandParser
-from .common import build_options
+from .common import build_options, solver_options
 from ..executor import Executor
 from ..model.configuration import Configuration
 from ..actions.graph_util import assign_style
@@ -13,7 +13,7 @@ def install_subcommand(sub_argparser: SubCommandParser):
         "graph",
         handler=handle_graph,
         help="Print dependency graph (dot format)",
-        parents=[build_options],
+        parents=[build_options, solver_options],
     )
     cmd_parser.add_argument("components", nargs="*")
     cmd_parser.add_argument(
@@ -81,7 +81,7 @@ def handle_graph(args):
             else:
                 actions.add(component.default_build.install)
 
-    executor = Executor(actions, no_force=args.no_force)
+    executor = Executor(actions, no_force=args.no_force, solver=args.solver)
 
     if not args.solved:
         graph = executor._create_initial_dependency_graph()
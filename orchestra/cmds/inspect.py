@@ -4,7 +4,7 @@ from loguru import logger
 
 from . import SubCommandParser
 from ..model.configuration import Configuration
-from ..model.install_metadata import load_file_list, is_installed
+from ..model.install_metadata import load_file_list, is_installed, find_file_owners
 
 
 def install_subcommand(sub_argparser: SubCommandParser):
@@ -14,6 +14,7 @@ def install_subcommand(sub_argparser: SubCommandParser):
     )
     install_config_subcommand(cmd_parser)
     install_component_subcommand(cmd_parser)
+    install_owner_subcommand(cmd_parser)
 
 
 def install_config_subcommand(sub_argparser: SubCommandParser):
@@ -24,6 +25,15 @@ def install_config_subcommand(sub_argparser: SubCommandParser):
     )
 
 
+def install_owner_subcommand(sub_argparser: SubCommandParser):
+    owner_parser = sub_argparser.add_subcmd(
+        "owner",
+        handler=handle_owner,
+        help="Print the components which installed the given files",
+    )
+    owner_parser.add_argument("paths", nargs="+", help="Paths of the files, absolute or relative to the orchestra root")
+
+
 def install_component_subcommand(sub_argparser: SubCommandParser):
     component_parser = sub_argparser.add_subcmd(
         "component",
@@ -70,6 +80,35 @@ def handle_installed_files(args):
     return 0
 
 
+def handle_owner(args):
+    config = Configuration(use_config_cache=args.config_cache)
+
+    paths = {}
+    for path in args.paths:
+        if os.path.isabs(path):
+            relative_path = os.path.relpath(path, config.orchestra_root)
+            if relative_path.startswith(os.pardir):
+                logger.error(f"{path} is not inside the orchestra root {config.orchestra_root}")
+                return 1
+        else:
+            relative_path = os.path.normpath(path)
+        paths[path] = relative_path
+
+    owners = find_file_owners(paths.values(), config)
+
+    result = 0
+    for path, relative_path in paths.items():
+        if relative_path not in owners:
+            logger.error(f"{path} is not owned by any installed component")
+            result = 2
+            continue
+
+        for owner in owners[relative_path]:
+            print(f"{path}: {owner}")
+
+    return result
+
+
 def handle_hash_material(args):
     config = Configuration(use_config_cache=args.config_cache)
     build = config.get_build(args.component)
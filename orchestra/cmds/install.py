@@ -1,7 +1,7 @@
 from loguru import logger
 
 from . import SubCommandParser
-from .common import build_options, execution_options
+from .common import build_options, execution_options, parallel_execution_options, resource_capacity, solver_options
 from ..executor import Executor
 from ..gitutils.lfs import assert_lfs_installed
 from ..model.configuration import Configuration
@@ -12,7 +12,7 @@ def install_subcommand(sub_argparser: SubCommandParser):
         "install",
         handler=handle_install,
         help="Build and install a component",
-        parents=[build_options, execution_options],
+        parents=[build_options, execution_options, parallel_execution_options, solver_options],
     )
     cmd_parser.add_argument("components", nargs="+", help="Name of the components to install")
     cmd_parser.add_argument("--no-force", action="store_true", help="Don't force execution of the root action")
@@ -55,7 +55,17 @@ def handle_install(args):
             actions.append(config.get_build(trigger).install)
 
     for action in actions:
-        executor = Executor([action], no_deps=args.no_deps, no_force=args.no_force, pretend=args.pretend)
+        executor = Executor(
+            [action],
+            no_deps=args.no_deps,
+            no_force=args.no_force,
+            pretend=args.pretend,
+            jobs=args.jobs,
+            make_jobs=args.make_jobs,
+            resource_capacity=resource_capacity(args),
+            prefetch_jobs=args.prefetch_jobs,
+            solver=args.solver,
+        )
         failed = executor.run()
         if failed:
             return 1
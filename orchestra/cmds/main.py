@@ -12,10 +12,12 @@ from . import fix_binary_archives_symlinks
 from . import graph
 from . import install
 from . import ls
+from . import migrate_metadata
 from . import shell
 from . import uninstall
 from . import update
 from . import upgrade
+from . import verify
 from . import version
 
 main_parser = SubCommandParser()
@@ -62,8 +64,10 @@ subcommands = [
     shell,
     ls,
     fix_binary_archives_symlinks,
+    migrate_metadata,
     inspect,
     binary_archives,
+    verify,
     version,
 ]
 
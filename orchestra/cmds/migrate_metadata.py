@@ -0,0 +1,25 @@
+from loguru import logger
+
+from . import SubCommandParser
+from ..model.configuration import Configuration
+from ..model.install_metadata import migrate_to_installed_components_database, uses_installed_components_database
+
+
+def install_subcommand(sub_argparser: SubCommandParser):
+    sub_argparser.add_subcmd(
+        "migrate-metadata",
+        handler=handle_migrate_metadata,
+        help="Store the metadata of the installed components in a single database instead of one file per component",
+    )
+
+
+def handle_migrate_metadata(args):
+    config = Configuration(use_config_cache=args.config_cache)
+
+    if uses_installed_components_database(config):
+        logger.info("The installed components database is already in use")
+        return 0
+
+    migrated_components = migrate_to_installed_components_database(config)
+    logger.info(f"Migrated the metadata of {len(migrated_components)} installed components")
+    return 0
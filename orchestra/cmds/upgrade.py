@@ -1,5 +1,5 @@
 from . import SubCommandParser
-from .common import execution_options, build_options
+from .common import execution_options, build_options, parallel_execution_options, resource_capacity, solver_options
 from ..executor import Executor
 from ..model.configuration import Configuration
 from ..model.install_metadata import load_metadata
@@ -10,7 +10,7 @@ def install_subcommand(sub_argparser: SubCommandParser):
         "upgrade",
         handler=handle_upgrade,
         help="Upgrade all manually installed components",
-        parents=[execution_options, build_options],
+        parents=[execution_options, build_options, parallel_execution_options, solver_options],
     )
 
 
@@ -36,7 +36,16 @@ def handle_upgrade(args):
 
     args.keep_tmproot = False
     args.no_merge = False
-    executor = Executor(install_actions, no_force=True, pretend=args.pretend)
+    executor = Executor(
+        install_actions,
+        no_force=True,
+        pretend=args.pretend,
+        jobs=args.jobs,
+        make_jobs=args.make_jobs,
+        resource_capacity=resource_capacity(args),
+        prefetch_jobs=args.prefetch_jobs,
+        solver=args.solver,
+    )
     failed = executor.run()
     exitcode = 1 if failed else 0
     return exitcode
@@ -0,0 +1,45 @@
+from loguru import logger
+
+from . import SubCommandParser
+from ..model.configuration import Configuration
+from ..model.install_metadata import is_installed
+from ..support.verify_root import RootVerifier
+
+
+def install_subcommand(sub_argparser: SubCommandParser):
+    cmd_parser = sub_argparser.add_subcmd(
+        "verify",
+        handler=handle_verify,
+        help="Check the consistency of the orchestra root with the metadata of the installed components",
+    )
+    cmd_parser.add_argument(
+        "components",
+        nargs="*",
+        help="Only check the files of these components (by default the whole root is checked)",
+    )
+    cmd_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Number of processes checking the files (defaults to the number of CPUs)",
+    )
+
+
+def handle_verify(args):
+    config = Configuration(use_config_cache=args.config_cache)
+
+    component_names = None
+    if args.components:
+        component_names = []
+        for component_name in args.components:
+            if not is_installed(config, component_name):
+                logger.error(f"Component {component_name} is not installed")
+                return 1
+            component_names.append(component_name)
+
+    if RootVerifier(config, jobs=args.jobs).verify(component_names):
+        logger.error("Inconsistencies found in the root directory!")
+        return 1
+
+    logger.info("Root directory consistency checks passed!")
+    return 0
@@ -1,69 +1,297 @@
 import graphlib
+import os
 import sys
 from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from itertools import permutations, product
 
 import enlighten
 import networkx as nx
-import networkx.classes.filters as nxfilters
 from loguru import logger
 
+from . import globals
 from .actions import AnyOfAction
 from .actions.action import ActionForBuild
+from .actions.install import InstallAction
+from .actions.util.jobserver import JobServer
+from .gitutils import lfs
 from .util import set_terminal_title
 from .exceptions import UserException, OrchestraException, InternalException
 
 DUMMY_ROOT = "Dummy root"
+# Duration (in seconds) assumed for actions for which no historical information is available
+DEFAULT_ACTION_DURATION = 60
+# Number of binary archives fetched by a single `git lfs fetch` invocation when prefetching
+PREFETCH_BATCH_SIZE = 16
+# Algorithms available to assign AnyOf choices, the first one is the default
+SOLVERS = ("constraint", "backtracking")
 
 
 class Executor:
-    def __init__(self, actions, no_deps=False, no_force=False, pretend=False):
+    def __init__(
+        self,
+        actions,
+        no_deps=False,
+        no_force=False,
+        pretend=False,
+        jobs=1,
+        make_jobs=None,
+        resource_capacity=None,
+        prefetch_jobs=0,
+        solver=SOLVERS[0],
+    ):
+        """
+        :arg jobs: maximum number of actions run concurrently
+        :arg make_jobs: number of tokens of the GNU make jobserver shared by all the user scripts.
+                        If None, a jobserver with one token per CPU is used only when running more than one action
+                        concurrently.
+        :arg resource_capacity: dictionary resource name -> available amount. The actions running concurrently will
+                                never require more than the available amount of each resource (see `Action.resources`).
+                                Resources not in the dictionary are considered unlimited.
+                                If None, the capacity of the machine is used (see `default_resource_capacity`).
+        :arg prefetch_jobs: number of binary archives downloaded concurrently (LFS concurrent transfers) in the
+                            background before the install actions using them are run. 0 disables prefetching.
+        :arg solver: algorithm used to assign AnyOf choices (see `SOLVERS`). All the solvers find the same assignment,
+                     "backtracking" is the plain search, "constraint" discards partial assignments which cannot lead
+                     to a solution as soon as possible.
+        """
+        if jobs < 1:
+            raise UserException(f"The number of parallel jobs must be at least 1 (got {jobs})")
+        if make_jobs is not None and make_jobs < 1:
+            raise UserException(f"The number of make jobs must be at least 1 (got {make_jobs})")
+        if prefetch_jobs < 0:
+            raise UserException(f"The number of prefetch jobs cannot be negative (got {prefetch_jobs})")
+        if solver not in SOLVERS:
+            raise UserException(f"Unknown solver {solver}, available solvers: {', '.join(SOLVERS)}")
+
         self.actions = actions
         self.no_deps = no_deps
         self.no_force = no_force
         self.pretend = pretend
+        self.jobs = jobs
+        self.make_jobs = make_jobs
+        self.resource_capacity = resource_capacity if resource_capacity is not None else default_resource_capacity()
+        self.prefetch_jobs = prefetch_jobs
+        self.solver = solver
 
         self._toposorter = TopologicalSorterWithStatusBar()
+        # Action -> estimated duration of the longest chain of actions that can start only after it completes
+        self._priorities = {}
+        # InstallAction -> future of the background download of its binary archive
+        self._prefetches = {}
 
     def run(self):
         dependency_graph = self._create_dependency_graph()
         self._verify_prerequisites(dependency_graph)
         self._init_toposorter(dependency_graph)
+        self._priorities = self._compute_priorities(dependency_graph)
 
         # The context manager starts the statusbar and ensures it's stopped on exit
-        with self._toposorter:
+        with self._jobserver(), self._prefetcher(dependency_graph), self._toposorter:
             return self._run_actions()
 
+    @contextmanager
+    def _prefetcher(self, dependency_graph):
+        """Starts downloading in the background the binary archives required by the install actions in the graph, so
+        that downloads overlap with the execution of other actions.
+        Archives are downloaded in order of priority, in batches of `PREFETCH_BATCH_SIZE` archives. Each batch is
+        fetched with one `git lfs fetch` invocation per binary archives repository, which avoids paying the startup
+        cost of git and LFS for every archive while still making the archives needed first available early.
+        Each install action gets its own future, so that an action whose batch was not started yet can cancel the
+        download of its archive and fetch it by itself.
+        On exit the downloads which were not started are cancelled.
+        """
+        if self.pretend or self.prefetch_jobs == 0:
+            yield
+            return
+
+        to_prefetch = [
+            action
+            for action in dependency_graph.nodes
+            if isinstance(action, InstallAction) and action.installs_from_binary_archive
+        ]
+        if not to_prefetch:
+            yield
+            return
+
+        to_prefetch.sort(key=lambda a: self._priorities.get(a, 0), reverse=True)
+        logger.debug(f"Prefetching {len(to_prefetch)} binary archives")
+        prefetch_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        batches = []
+        try:
+            for i in range(0, len(to_prefetch), PREFETCH_BATCH_SIZE):
+                batch = {action: Future() for action in to_prefetch[i : i + PREFETCH_BATCH_SIZE]}
+                self._prefetches.update(batch)
+                batches.append(prefetch_worker.submit(self._prefetch_batch, batch))
+            yield
+        finally:
+            # ThreadPoolExecutor.shutdown(cancel_futures=True) requires python >= 3.9
+            for future in batches + list(self._prefetches.values()):
+                future.cancel()
+            prefetch_worker.shutdown()
+            self._prefetches = {}
+
+    def _prefetch_batch(self, batch):
+        """Fetches the binary archives of a batch of install actions and resolves their futures.
+        The actions which cancelled their future in the meantime are skipped.
+        """
+        batch = {action: future for action, future in batch.items() if future.set_running_or_notify_cancel()}
+        if not batch:
+            return
+
+        try:
+            lfs.fetch_files(
+                [action.locate_binary_archive() for action in batch],
+                checkout=False,
+                concurrent_transfers=self.prefetch_jobs,
+            )
+        except Exception as exception:
+            for future in batch.values():
+                future.set_exception(exception)
+        else:
+            for future in batch.values():
+                future.set_result(None)
+
+    @contextmanager
+    def _jobserver(self):
+        """Starts the jobserver shared by all the scripts run by the actions, if required"""
+        make_jobs = self.make_jobs
+        if make_jobs is None and self.jobs > 1:
+            make_jobs = os.cpu_count() or 1
+
+        if make_jobs is None:
+            yield
+            return
+
+        with JobServer(make_jobs) as jobserver:
+            globals.jobserver = jobserver
+            try:
+                yield
+            finally:
+                globals.jobserver = None
+
     def _run_actions(self, stop_on_failure=True):
         """Runs all the actions in the toposorter (in an order that respects dependencies)
-        :arg stop_on_failure: stop execution as soon as one action fails
+        Up to `self.jobs` actions are run concurrently, each one in its own worker thread.
+        :arg stop_on_failure: stop scheduling new actions as soon as one action fails.
+                              Actions which are already running are allowed to complete.
         """
         failed_actions = set()
 
         if not self._toposorter.is_active():
             logger.info("No actions to perform")
+            return failed_actions
+
+        # Actions whose dependencies are satisfied but which were not started yet
+        ready_actions = []
+        # Future -> action running in a worker
+        running_actions = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as workers:
+            while True:
+                if not failed_actions or not stop_on_failure:
+                    ready_actions.extend(self._toposorter.get_ready())
+                    while ready_actions and len(running_actions) < self.jobs:
+                        action = self._pick_next_action(ready_actions, running_actions.values())
+                        if action is None:
+                            break
+                        ready_actions.remove(action)
+                        self._toposorter.start_jobs(action)
+                        running_actions[workers.submit(self._run_action, action)] = action
+
+                if not running_actions:
+                    break
 
-        while self._toposorter.is_active() and (not failed_actions or not stop_on_failure):
-            for action in self._toposorter.get_ready():
-                try:
-                    self._toposorter.start_jobs(action)
-                    explicitly_requested = action in self.actions
-                    action.run(pretend=self.pretend, explicitly_requested=explicitly_requested)
-                    self._toposorter.done(action)
-                except OrchestraException as exception:
-                    exception.log_error()
-                    failed_actions.add(action)
-                    if stop_on_failure:
-                        break
-                except:
-                    # The call to logger.exception automatically prints the exception info
-                    logger.exception(f"An unexpected exception occurred while running {action}")
-                    failed_actions.add(action)
-                    if stop_on_failure:
-                        break
+                completed, _ = wait(running_actions, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    action = running_actions.pop(future)
+                    if future.result():
+                        self._toposorter.done(action)
+                    else:
+                        failed_actions.add(action)
 
         return failed_actions
 
+    def _pick_next_action(self, ready_actions, running_actions):
+        """Picks the ready action to start next, or None if no ready action can be started right now.
+        Ready actions are considered in order of priority (longest remaining critical path first, then heaviest first)
+        and the first one that fits the resources left available by the running actions is picked.
+        If no action fits and no action is running, the first one in that order is picked even if it requires more than
+        the machine capacity, otherwise it would never be run.
+        """
+        available_resources = dict(self.resource_capacity)
+        for action in running_actions:
+            for resource, amount in action.resources.items():
+                if resource in available_resources:
+                    available_resources[resource] -= amount
+
+        candidates = sorted(
+            ready_actions,
+            key=lambda a: (self._priorities.get(a, 0), self._resources_weight(a)),
+            reverse=True,
+        )
+        for action in candidates:
+            if all(
+                amount <= available_resources[resource]
+                for resource, amount in action.resources.items()
+                if resource in available_resources
+            ):
+                return action
+
+        if not running_actions:
+            return candidates[0]
+
+        return None
+
+    def _resources_weight(self, action):
+        """Returns the fraction of the machine capacity required by an action, summed over all resources"""
+        return sum(
+            amount / self.resource_capacity[resource]
+            for resource, amount in action.resources.items()
+            if self.resource_capacity.get(resource)
+        )
+
+    @staticmethod
+    def _compute_priorities(dependency_graph):
+        """Computes the priority of each action as the estimated duration of the longest path (critical path) starting
+        from a root of the graph and ending with the action, weighted by the historical durations of the actions.
+        In other words, the priority is the minimum amount of time required to complete all the actions which
+        (transitively) depend on the action, once it is started.
+        Starting the action with the longest tail first is a simple heuristic which usually shortens the total time
+        required by a parallel execution.
+        """
+        priorities = {}
+        # Edges go from an action to its dependencies, so dependent actions are visited first
+        for action in nx.topological_sort(dependency_graph):
+            duration = action.estimated_duration
+            if duration is None:
+                duration = DEFAULT_ACTION_DURATION
+            tail = max((priorities[p] for p in dependency_graph.predecessors(action)), default=0)
+            priorities[action] = duration + tail
+        return priorities
+
+    def _run_action(self, action):
+        """Runs a single action, logging any error.
+        :returns: True if the action was successful
+        """
+        prefetch = self._prefetches.get(action)
+        # If the download did not start yet the action fetches the binary archive by itself, otherwise it waits for it
+        if prefetch is not None and not prefetch.cancel() and prefetch.exception() is not None:
+            # The action will try to fetch the binary archive again and report the error if it fails
+            logger.debug(f"Could not prefetch the binary archive for {action}: {prefetch.exception()}")
+
+        try:
+            explicitly_requested = action in self.actions
+            action.run(pretend=self.pretend, explicitly_requested=explicitly_requested)
+            return True
+        except OrchestraException as exception:
+            exception.log_error()
+        except:
+            # The call to logger.exception automatically prints the exception info
+            logger.exception(f"An unexpected exception occurred while running {action}")
+        return False
+
     def _create_dependency_graph(
         self,
         remove_unreachable=True,
@@ -150,6 +378,10 @@ class Executor:
         search: the choices of disjoint Strongly Connected Components can be assigned independently of one another.
         Intuitively, removing an edge from an SCC cannot create or destroy cycles in another SCC, as they don't share
         any edge.
+        Choices in SCCs made of a single node can't create cycles at all, so once only those are left they are all
+        assigned at once to their preferred alternative (see `keyer`), which is what the search would pick anyway.
+
+        The "constraint" solver prunes the search further, see `_is_consistent`.
         """
         # Iterate until all the AnyOf nodes have been assigned a choice
         while has_choices(graph):
@@ -166,6 +398,10 @@ class Executor:
                 if not any_of_nodes:
                     # There are no AnyOf nodes in this SCC, don't waste time
                     continue
+                if len(strongly_connected_component) == 1:
+                    # SCCs are sorted by size, only single node SCCs are left
+                    self._assign_trivial_choices(graph, strongly_connected_components)
+                    break
                 graph = self._assign_strongly_connected_component(graph, any_of_nodes, strongly_connected_component)
                 if graph is None:
                     return graph
@@ -173,30 +409,40 @@ class Executor:
 
         return graph
 
+    @staticmethod
+    def _assign_trivial_choices(graph, strongly_connected_components):
+        """Assigns the choices of the AnyOf nodes which are the only node of their SCC to the preferred alternative"""
+        for strongly_connected_component in strongly_connected_components:
+            if len(strongly_connected_component) != 1:
+                continue
+            to_assign = next(iter(strongly_connected_component))
+            if not isinstance(to_assign, AnyOfAction):
+                continue
+            alternatives = list(graph.successors(to_assign))
+            if len(alternatives) < 2:
+                continue
+            alternatives.sort(key=keyer(to_assign))
+            graph.remove_edges_from((to_assign, a) for a in alternatives[1:])
+
     def _assign_strongly_connected_component(self, graph, remaining, strongly_connected_component):
         """Searches for a solution to the given remaining choices in the given SCC
 
         This is done via a recursive backtracking search: one of the possible choices is made, then this function
         invokes itself recursively to assign the remaining choices.
         If an invalid choice is found the search resumes from the innermost call which has more options to try.
+        When using the "constraint" solver each choice is checked against the choices already made (see
+        `_is_consistent`) and discarded immediately if it can't lead to a solution.
 
         :arg graph: the complete dependency graph
         :arg remaining: list of AnyOf nodes with more than one successor (and therefore need an assignment)
         :arg strongly_connected_component: the strongly connected component containing the remaining nodes
         """
-        # TODO: the copy() operation ~halves performance. The other edge/node add/removal
-        #       operations have an impact as well. We can avoid them using filtered views.
-
         # No more choices remain, check if the subgraph of the strongly connected components is cyclic
         if not remaining:
-            subgraph = graph.copy()
-            self._remove_unreachable_actions(subgraph, [DUMMY_ROOT])
-            subgraph = subgraph.subgraph(strongly_connected_component)
-
-            if has_unsatisfied_cycles(subgraph):
-                return None
-            else:
+            if self._is_solution(graph, strongly_connected_component):
                 return graph
+            else:
+                return None
 
         to_assign = remaining.pop()
 
@@ -216,8 +462,11 @@ class Executor:
             for n in pointless:
                 remaining.remove(n)
 
-            # Recursive call to assign the remaining choices
-            solved_graph = self._assign_strongly_connected_component(graph, remaining, strongly_connected_component)
+            # Recursive call to assign the remaining choices, unless the choice is already known to be invalid
+            if self.solver == "constraint" and not self._is_consistent(graph, strongly_connected_component):
+                solved_graph = None
+            else:
+                solved_graph = self._assign_strongly_connected_component(graph, remaining, strongly_connected_component)
             if solved_graph is None:
                 # No possible assignment of the remaining choices was valid, so our choice was invalid
                 graph.remove_edge(to_assign, alternative)
@@ -233,6 +482,32 @@ class Executor:
         remaining.append(to_assign)
         return None
 
+    @staticmethod
+    def _is_solution(graph, strongly_connected_component):
+        """Returns True if the nodes of the given SCC reachable from the root do not form unsatisfied cycles"""
+        reachable = nx.descendants(graph, DUMMY_ROOT)
+        subgraph = graph.subgraph(reachable.intersection(strongly_connected_component))
+        return not has_unsatisfied_cycles(subgraph)
+
+    @staticmethod
+    def _is_consistent(graph, strongly_connected_component):
+        """Returns False if the choices made so far cannot lead to a solution, whatever the remaining choices are.
+
+        Consider the graph obtained by dropping the edges of the undecided AnyOf nodes: each complete assignment
+        only adds edges to it (one for each undecided node), so the nodes reachable from the root stay reachable and
+        any cycle stays in place. If this graph already contains unsatisfied cycles among the reachable nodes of the
+        SCC, `_is_solution` would reject all the complete assignments, so the search can backtrack immediately.
+        This never discards a valid assignment, so the solution found is the same found without this check.
+        """
+
+        def is_decided(u, v):
+            return not (isinstance(u, AnyOfAction) and graph.out_degree(u) > 1)
+
+        decided_graph = nx.subgraph_view(graph, filter_edge=is_decided)
+        reachable = nx.descendants(decided_graph, DUMMY_ROOT)
+        subgraph = decided_graph.subgraph(reachable.intersection(strongly_connected_component))
+        return not has_unsatisfied_cycles(subgraph)
+
     @staticmethod
     def _simplify_anyof_actions(graph):
         for action in list(graph.nodes):
@@ -303,10 +578,12 @@ class Executor:
         Each group contains:
          1. actions that pertain to a specific build of the component
          2. actions that directly depend on actions of point 1
-        The algorithm tries all possible permutations of the groups in the list.
-        For each permutation [G1, G2, ..., Gn] all actions in
+        The algorithm looks for a permutation of the groups in the list.
+        For a permutation [G1, G2, ..., Gn] all actions in
         group Gi are marked to depend on all actions in group Gi+1.
         The graph is checked for cycles and if none are found the order is accepted.
+        The permutation implied by the existing dependencies between the groups is tried first, falling back to trying
+        all the permutations (see `_try_group_orders`).
         """
         scheduled_actions_per_build = defaultdict(set)
         scheduled_builds_per_component = defaultdict(set)
@@ -328,8 +605,8 @@ class Executor:
                 group = scheduled_actions_per_build[bld].union(scheduled_actions_per_direct_build_dependency[bld])
                 groups_by_component[c].append(group)
 
-        for component, group in groups_by_component.items():
-            dependency_graph = self._try_group_orders(dependency_graph, group)
+        for component, groups in groups_by_component.items():
+            dependency_graph = self._try_group_orders(dependency_graph, groups)
             if dependency_graph is None:
                 raise UserException(
                     f"Could not enforce an order between actions of "
@@ -338,69 +615,140 @@ class Executor:
 
         return dependency_graph
 
+    def _try_group_orders(self, dependency_graph, groups):
+        """Searches an order of the given groups such that adding the ordering edges to the dependency graph does not
+        create unsatisfied cycles.
+        Returns the dependency graph with the edges of the order that was found, or None if no valid order exists (in
+        this case the dependency graph is left unchanged).
+
+        The order implied by the paths already in the graph (see `_implied_group_order`) is tried first. Only if it is
+        not valid all the permutations of the groups are tried, which is needed only when some of the cycles that
+        the implied order avoids are satisfied.
+        """
+        # Adding edges can't remove cycles, no permutation can be valid
+        if has_unsatisfied_cycles(dependency_graph):
+            return None
+
+        implied_order = self._implied_group_order(dependency_graph, groups)
+        if implied_order is not None and self._try_group_order(dependency_graph, implied_order):
+            return dependency_graph
+
+        for permutation in permutations(groups):
+            if list(permutation) == implied_order:
+                continue
+
+            if self._try_group_order(dependency_graph, permutation):
+                return dependency_graph
+
+        return None
+
     @staticmethod
-    def _try_group_orders(dependency_graph, group):
-        for permutation in permutations(group):
-            # TODO: duplicating the graph is not good for performance, might be worth removing nodes manually
-            depgraph_copy = dependency_graph.copy()
-
-            for g1, g2 in zip(permutation, permutation[1:]):
-                # Add edge from all nodes in g1 to all nodes in g2
-                for a1, a2 in product(g1, g2):
-                    same_action = a1 is a2
-                    same_build = (
-                        isinstance(a1, ActionForBuild) and isinstance(a2, ActionForBuild) and a1.build is a2.build
-                    )
-
-                    # Don't add self loops or edges between actions for the same build.
-                    # Self loops add an unbreakable cycle that we obviously don't want.
-                    # Edges between actions of the same build do not have any advantage in the best case
-                    # as depencencies for other actions of the same build do not cause order-of-execution issues,
-                    # while in the worst case they introduce unbreakable cycles (install A -> configure A -> install A).
-                    if same_action or same_build:
-                        continue
-
-                    depgraph_copy.add_edge(a1, a2, label="Intra-component ordering")
-
-            if not has_unsatisfied_cycles(depgraph_copy):
-                return depgraph_copy
+    def _implied_group_order(dependency_graph, groups):
+        """Returns the order of the groups implied by the paths between them in the dependency graph, or None if the
+        paths imply a cycle.
+
+        If the graph has a path from group Gj to group Gi, Gi can't precede Gj: ordering Gi before Gj adds edges from Gi
+        to Gj (directly or through the groups in between) and closes a cycle.
+        The implied order is the topological order of the graph of these constraints which preserves the original
+        order of the groups as much as possible, which is the first permutation that would be tried by the search.
+        Computing it takes polynomial time.
+        """
+        reachable_from_group = []
+        for group in groups:
+            reachable = set()
+            for action in group:
+                reachable.update(nx.descendants(dependency_graph, action))
+            reachable_from_group.append(reachable)
+
+        constraints = nx.DiGraph()
+        constraints.add_nodes_from(range(len(groups)))
+        for i, group in enumerate(groups):
+            for j, reachable in enumerate(reachable_from_group):
+                if i != j and not reachable.isdisjoint(group):
+                    constraints.add_edge(j, i)
+
+        try:
+            return [groups[i] for i in nx.lexicographical_topological_sort(constraints)]
+        except nx.NetworkXUnfeasible:
+            return None
 
     @staticmethod
-    def _transitive_reduction(graph):
-        labels = nx.get_edge_attributes(graph, "label")
-
-        if nx.is_directed_acyclic_graph(graph):
-            reduced_graph = nx.algorithms.dag.transitive_reduction(graph)
-            nx.set_edge_attributes(reduced_graph, labels, "label")
-            return reduced_graph
-
-        # It is not possible (rather, it is expensive and not uniquely defined)
-        # to compute the transitive reduction on a graph with cycles
-        # So we:
-        #  - perform a condensation which gives us a DAG
-        #    (by "shrinking" all strongly connected components in a single node)
-        #  - perform a transitive reduction
-        #  - expand the condensed graph back to it's expanded form
-        condensed_graph = nx.algorithms.condensation(graph)
-        mapping = condensed_graph.graph["mapping"]
-        members = nx.get_node_attributes(condensed_graph, "members")
+    def _try_group_order(dependency_graph, ordered_groups):
+        """Adds the edges which enforce the given order of the groups to the dependency graph.
+        Returns True on success. If the edges would create an unsatisfied cycle the dependency graph is left unchanged
+        and False is returned.
+        """
+        # Edges added for this order, removed if the order turns out to be invalid
+        added_edges = []
+
+        for g1, g2 in zip(ordered_groups, ordered_groups[1:]):
+            # Add edge from all nodes in g1 to all nodes in g2
+            for a1, a2 in product(g1, g2):
+                same_action = a1 is a2
+                same_build = isinstance(a1, ActionForBuild) and isinstance(a2, ActionForBuild) and a1.build is a2.build
+
+                # Don't add self loops or edges between actions for the same build.
+                # Self loops add an unbreakable cycle that we obviously don't want.
+                # Edges between actions of the same build do not have any advantage in the best case
+                # as depencencies for other actions of the same build do not cause order-of-execution issues,
+                # while in the worst case they introduce unbreakable cycles (install A -> configure A -> install A).
+                if same_action or same_build or dependency_graph.has_edge(a1, a2):
+                    continue
+
+                # Check every edge as it is added, so invalid orders are discarded as soon as possible
+                if creates_unsatisfied_cycles(dependency_graph, a1, a2):
+                    dependency_graph.remove_edges_from(added_edges)
+                    return False
 
-        condensed_graph = nx.algorithms.transitive_reduction(condensed_graph)
+                dependency_graph.add_edge(a1, a2, label="Intra-component ordering")
+                added_edges.append((a1, a2))
 
-        # TODO: review this code, it may be re-adding edges that were taken out by the transitive reduction
-        inflated_graph = nx.DiGraph()
-        for condensed_node in condensed_graph.nodes:
-            condensed_node_members = members[condensed_node]
-            subgraph = nx.subgraph_view(graph, filter_node=nxfilters.show_nodes(condensed_node_members))
-            inflated_graph = nx.union(inflated_graph, subgraph)
+        return True
 
-            for u, v in graph.out_edges(condensed_node_members):
-                v_condensed_node = mapping[v]
-                if condensed_graph.has_edge(condensed_node, v_condensed_node):
-                    inflated_graph.add_edge(u, v)
+    @staticmethod
+    def _transitive_reduction(graph):
+        """Returns the transitive reduction of the graph, keeping the edge attributes (e.g. "label").
+
+        The transitive reduction is not uniquely defined (and expensive to compute) for graphs with cycles, so this
+        pass works on the condensation of the graph, which is a DAG obtained by "shrinking" each strongly connected
+        component to a single node:
+         - the edges inside a strongly connected component are all kept
+         - the edges between two strongly connected components are kept only if the corresponding edge of the
+           condensation is not implied by other edges
+
+        The condensation is visited in reverse topological order, computing the set of components reachable from
+        each component as a bitset (bit i represents the i-th component in topological order).
+        An edge C -> D is implied if D is reachable from another successor of C. Such a successor must precede D in
+        topological order, so visiting the successors of C in topological order and accumulating what they can reach
+        is enough to find all the implied edges.
+        """
+        condensed_graph = nx.algorithms.condensation(graph)
+        mapping = condensed_graph.graph["mapping"]
 
-        nx.set_edge_attributes(inflated_graph, labels, "label")
-        return inflated_graph
+        topological_order = list(nx.topological_sort(condensed_graph))
+        topological_index = {c: i for i, c in enumerate(topological_order)}
+
+        reachable = {}
+        kept_condensed_edges = set()
+        for condensed_node in reversed(topological_order):
+            successors = sorted(condensed_graph.successors(condensed_node), key=topological_index.__getitem__)
+            reachable_from_node = 0
+            for successor in successors:
+                successor_bit = 1 << topological_index[successor]
+                if reachable_from_node & successor_bit:
+                    continue
+                kept_condensed_edges.add((condensed_node, successor))
+                reachable_from_node |= successor_bit | reachable[successor]
+            reachable[condensed_node] = reachable_from_node
+
+        reduced_graph = nx.DiGraph()
+        reduced_graph.add_nodes_from(graph.nodes(data=True))
+        reduced_graph.add_edges_from(
+            (u, v, data)
+            for u, v, data in graph.edges(data=True)
+            if mapping[u] == mapping[v] or (mapping[u], mapping[v]) in kept_condensed_edges
+        )
+        return reduced_graph
 
     @staticmethod
     def _verify_prerequisites(dependency_graph):
@@ -420,14 +768,52 @@ class Executor:
             raise InternalException(f"A cycle was found in the solved dependency graph: {e.args[1]}")
 
 
+def default_resource_capacity():
+    """Returns the resources available on this machine: number of CPUs and memory (in GiB)"""
+    capacity = {"cpu": os.cpu_count() or 1}
+    try:
+        capacity["memory"] = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2 ** 30
+    except (ValueError, OSError):
+        logger.debug("Could not determine the amount of memory of this machine")
+    return capacity
+
+
 def has_unsatisfied_cycles(graph):
-    simple_cycles = list(nx.simple_cycles(graph))
-    for cycle in simple_cycles:
-        if not all(c.is_satisfied() for c in cycle):
+    """Returns True if the graph contains a cycle with at least one unsatisfied node.
+
+    Every node of a strongly connected component with more than one node lies on a cycle, so it is sufficient to look
+    for an unsatisfied node in such components (or with a self loop), which takes linear time.
+    """
+    for strongly_connected_component in nx.strongly_connected_components(graph):
+        if len(strongly_connected_component) == 1:
+            node = next(iter(strongly_connected_component))
+            if not graph.has_edge(node, node):
+                continue
+        if not all(n.is_satisfied() for n in strongly_connected_component):
             return True
     return False
 
 
+def creates_unsatisfied_cycles(graph, u, v):
+    """Returns True if adding the edge (u, v) to a graph without unsatisfied cycles creates an unsatisfied cycle.
+    The graph is not modified.
+
+    The new cycles all go through the new edge, so they contain only the nodes reachable from v which can reach u.
+    Removing an edge can't create cycles, so there's no need for a check in that case.
+    """
+    if u == v:
+        return not u.is_satisfied()
+
+    reachable_from_v = nx.descendants(graph, v)
+    if u not in reachable_from_v:
+        return False
+
+    reaching_u = nx.ancestors(graph, u)
+    cycle_nodes = reachable_from_v.intersection(reaching_u)
+    cycle_nodes.update((u, v))
+    return not all(n.is_satisfied() for n in cycle_nodes)
+
+
 def has_choices(graph):
     """Returns true if a graph contains undecided AnyOf nodes"""
     for node in graph.nodes:
@@ -466,11 +852,13 @@ def filter_out_unreachable(graph: nx.DiGraph, nodes, roots):
     :arg nodes: the nodes of interest to filter
     :arg roots: the root nodes
     """
-    shortest_paths = nx.multi_source_dijkstra_path_length(graph, roots)
+    reachable_nodes = set(roots)
+    for root in roots:
+        reachable_nodes.update(nx.descendants(graph, root))
     reachable = []
     unreachable = []
     for node in nodes:
-        if node not in shortest_paths:
+        if node not in reachable_nodes:
             unreachable.append(node)
         else:
             reachable.append(node)
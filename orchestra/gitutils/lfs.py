@@ -1,17 +1,23 @@
+import threading
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Iterable, List, Optional, Union
 
-from . import run_git
+from . import get_worktree_root, run_git
 from ..exceptions import UserException, InternalSubprocessException
 
 
 _lfs_install_checked = False
 
+# `git lfs checkout` updates the index, concurrent checkouts would fail to acquire index.lock
+_checkout_lock = threading.Lock()
+
 
 def fetch(
     workdir,
     checkout=True,
     include: Optional[List[Union[str, Path]]] = None,
+    concurrent_transfers: Optional[int] = None,
 ):
     """
     Fetch (and checkout) git lfs tracked files
@@ -19,16 +25,24 @@ def fetch(
     :param checkout: if True (default), the files are also checked out so their content matches the one tracked by LFS
     :param include: optional list of paths to fetch. Paths must be relative to the repository root. Some shell
              expansions are supported (e.g. *.tar.gz), see `man git-lfs-fetch`.
+    :param concurrent_transfers: number of objects downloaded concurrently (optional, overrides
+             lfs.concurrenttransfers)
     """
     assert_lfs_installed()
 
     if include is None:
         include = []
 
-    fetch_cmd = [
-        "lfs",
-        "fetch",
-    ]
+    fetch_cmd = []
+    if concurrent_transfers is not None:
+        fetch_cmd.append("-c")
+        fetch_cmd.append(f"lfs.concurrenttransfers={concurrent_transfers}")
+    fetch_cmd.extend(
+        [
+            "lfs",
+            "fetch",
+        ]
+    )
     if include:
         fetch_cmd.append("--include")
         fetch_cmd.append(",".join(str(i) for i in include))
@@ -43,7 +57,31 @@ def fetch(
     ]
     for include_file in include:
         checkout_cmd.append(str(include_file))
-    run_git(*checkout_cmd, workdir=workdir)
+    with _checkout_lock:
+        run_git(*checkout_cmd, workdir=workdir)
+
+
+def fetch_files(
+    paths: Iterable[Union[str, Path]],
+    checkout=True,
+    concurrent_transfers: Optional[int] = None,
+):
+    """
+    Fetch (and checkout) the given git lfs tracked files, possibly belonging to different repositories.
+    The files belonging to the same repository are fetched in a single batched transfer.
+    :param paths: absolute paths of the files to fetch
+    :param checkout: if True (default), the files are also checked out so their content matches the one tracked by LFS
+    :param concurrent_transfers: number of objects downloaded concurrently (optional, overrides
+             lfs.concurrenttransfers)
+    """
+    paths_by_worktree = defaultdict(list)
+    for path in paths:
+        path = Path(path)
+        worktree_root = get_worktree_root(path)
+        paths_by_worktree[worktree_root].append(path.relative_to(worktree_root))
+
+    for worktree_root, include in paths_by_worktree.items():
+        fetch(worktree_root, checkout=checkout, include=include, concurrent_transfers=concurrent_transfers)
 
 
 def assert_lfs_installed():
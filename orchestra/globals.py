@@ -1,6 +1,8 @@
 global loglevel
 global quiet
 global orchestra_dotdir
+global jobserver
 loglevel = "INFO"
 quiet = False
 orchestra_dotdir = None
+jobserver = None
@@ -25,6 +25,10 @@ class Build:
         self.ndebug = serialized_build.get("ndebug", True)
         self.asan = serialized_build.get("asan", False)
 
+        # Resources needed to build this component, used as scheduling hints.
+        # They do not affect the build output, so they are not part of the serialized build (and of the hash material)
+        self.resources = serialized_build.get("resources", {})
+
         configure_script = serialized_build["configure"]
         self.configure = configure.ConfigureAction(self, configure_script, configuration)
 
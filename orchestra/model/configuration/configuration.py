@@ -13,6 +13,7 @@ from pkg_resources import parse_version
 from ._generate import generate_yaml_configuration, validate_configuration_schema
 from ..component import Component
 from ..remote_cache import RemoteHeadsCache
+from ...actions.archive import DEFAULT_BINARY_ARCHIVES_FORMAT
 from ...actions.util import try_run_internal_subprocess, get_subprocess_output
 from ...exceptions import UserException, InternalException
 from ...util import parse_component_name, expand_variables
@@ -87,6 +88,7 @@ class Configuration:
 
         self.remotes = self._get_remotes()
         self.binary_archives_remotes = self._get_binary_archives_remotes()
+        self.binary_archives_formats = self._get_binary_archives_formats()
         self.branches = self._get_branches()
 
         self._user_paths = self.parsed_yaml.get("paths", {})
@@ -94,6 +96,9 @@ class Configuration:
         remote_heads_cache_path = os.path.join(self.cache_dir, "remote_refs_cache.json")
         self.remote_heads_cache = RemoteHeadsCache(self, remote_heads_cache_path)
 
+        # Snapshot of the metadata of the installed components, loaded on first use (see install_metadata)
+        self.installed_metadata_snapshot = None
+
         self._initialize_paths()
         self._parse_components()
 
@@ -290,6 +295,14 @@ class Configuration:
                 remotes[name] = url
         return remotes
 
+    def _get_binary_archives_formats(self):
+        """Returns the format of the binary archives created in each binary archives repository"""
+        formats = self.parsed_yaml.get("binary_archives_formats", {})
+        for name in formats:
+            if name not in self.binary_archives_remotes:
+                raise UserException(f"Format specified for unknown binary archives repository {name}")
+        return {name: formats.get(name, DEFAULT_BINARY_ARCHIVES_FORMAT) for name in self.binary_archives_remotes}
+
     def _get_branches(self):
         branches = self.parsed_yaml.get("branches", [])
         assert type(branches) is list
@@ -1,9 +1,28 @@
 import json
 import os
-from typing import List, Optional
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import closing, contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
 
 from . import build as bld
 from . import configuration
+from ..exceptions import UserException
+
+# Serializes the initialization of the installed metadata snapshots
+_snapshot_lock = threading.Lock()
+
+# Serializes the updates of the installed files owners cache
+_owners_lock = threading.Lock()
+
+# Maximum number of parameters bound to a single SQLite statement
+_DATABASE_CHUNK_SIZE = 500
+
+# Maps the paths installed by a component to their size, mode and content digest (see `actions.merge.manifest_entry`)
+Manifest = Dict[str, Tuple[int, int, str]]
 
 
 class InstallMetadata:
@@ -78,33 +97,108 @@ def is_installed(
     return correct_build and correct_hash
 
 
+def installed_component_names(config: "configuration.Configuration") -> List[str]:
+    """Returns the names of all the installed components"""
+    return sorted(metadata["component_name"] for metadata in _installed_metadata_snapshot(config).values())
+
+
 def load_metadata(component_name, config: "configuration.Configuration") -> Optional[InstallMetadata]:
     """Returns the metadata for an installed component.
     If the component is not installed, returns None
     """
-    metadata_path = installed_component_metadata_path(component_name, config)
-    if not os.path.exists(metadata_path):
+    serialized_metadata = _installed_metadata_snapshot(config).get(_metadata_key(component_name))
+    if serialized_metadata is None:
         return None
 
-    with open(metadata_path) as f:
-        serialized_metadata = json.load(f)
-
     return _deserialize_metadata(serialized_metadata)
 
 
 def save_metadata(metadata: InstallMetadata, config: "configuration.Configuration"):
     """Writes metadata to disk"""
-    _create_metadata_dir(config)
+    serialized_metadata = dict(metadata.serialize())
+
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            database.execute(
+                "INSERT OR REPLACE INTO components (component_name, metadata) VALUES (?, ?)",
+                (metadata.component_name, json.dumps(serialized_metadata)),
+            )
+    else:
+        _create_metadata_dir(config)
+        metadata_path = installed_component_metadata_path(metadata.component_name, config)
+        with open(metadata_path, "w") as f:
+            json.dump(serialized_metadata, f)
+
+    _installed_metadata_snapshot(config)[_metadata_key(metadata.component_name)] = serialized_metadata
+
+
+def remove_metadata(component_name: str, config: "configuration.Configuration"):
+    """Deletes the metadata of a component from disk"""
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            database.execute("DELETE FROM components WHERE component_name = ?", (component_name,))
+    else:
+        os.remove(installed_component_metadata_path(component_name, config))
+
+    _installed_metadata_snapshot(config).pop(_metadata_key(component_name), None)
+
+
+def _installed_metadata_snapshot(config: "configuration.Configuration") -> Dict[str, dict]:
+    """Returns the serialized metadata of all the installed components, indexed by `_metadata_key`.
+    The metadata is read from disk the first time this function is called for a given configuration, then the
+    snapshot is kept up to date by `save_metadata` and `remove_metadata`.
+    """
+    with _snapshot_lock:
+        if config.installed_metadata_snapshot is None:
+            if uses_installed_components_database(config):
+                config.installed_metadata_snapshot = _load_installed_metadata_from_database(config)
+            else:
+                config.installed_metadata_snapshot = _load_installed_metadata(config)
+        return config.installed_metadata_snapshot
+
 
-    metadata_path = installed_component_metadata_path(metadata.component_name, config)
-    with open(metadata_path, "w") as f:
-        json.dump(metadata.serialize(), f)
+def _load_installed_metadata(config: "configuration.Configuration") -> Dict[str, dict]:
+    snapshot = {}
+    if not os.path.isdir(config.installed_component_metadata_dir):
+        return snapshot
+
+    with os.scandir(config.installed_component_metadata_dir) as entries:
+        for entry in entries:
+            key, extension = os.path.splitext(entry.name)
+            if extension != ".json" or not entry.is_file():
+                continue
+
+            try:
+                with open(entry.path) as f:
+                    snapshot[key] = json.load(f)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring invalid metadata file {entry.path}")
+
+    return snapshot
+
+
+def _load_installed_metadata_from_database(config: "configuration.Configuration") -> Dict[str, dict]:
+    with _open_database(config) as database:
+        rows = database.execute("SELECT component_name, metadata FROM components").fetchall()
+    return {_metadata_key(component_name): json.loads(metadata) for component_name, metadata in rows}
+
+
+def _metadata_key(component_name: str) -> str:
+    return component_name.replace("/", "_")
 
 
 def load_file_list(component_name: str, config: "configuration.Configuration") -> Optional[List[str]]:
     """Returns a list of the files associated with an installed component.
     If the component is not installed, returns None
     """
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            rows = database.execute(
+                "SELECT path FROM files WHERE component_name = ? ORDER BY rowid",
+                (component_name,),
+            ).fetchall()
+        return [path for path, in rows]
+
     file_list_path = installed_component_file_list_path(component_name, config)
     with open(file_list_path) as f:
         paths = f.read().splitlines()
@@ -113,6 +207,11 @@ def load_file_list(component_name: str, config: "configuration.Configuration") -
 
 def save_file_list(component_name: str, file_list: List[str], config: "configuration.Configuration"):
     """Writes the installed file list to disk"""
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            _replace_file_list(database, component_name, file_list)
+        return
+
     _create_metadata_dir(config)
 
     file_list_path = installed_component_file_list_path(component_name, config)
@@ -120,6 +219,212 @@ def save_file_list(component_name: str, file_list: List[str], config: "configura
         new_files = [f"{f}\n" for f in file_list]
         f.writelines(new_files)
 
+    _update_owners_cache(component_name, file_list, config)
+
+
+def remove_file_list(component_name: str, config: "configuration.Configuration"):
+    """Deletes the installed file list from disk"""
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            database.execute("DELETE FROM files WHERE component_name = ?", (component_name,))
+    else:
+        os.remove(installed_component_file_list_path(component_name, config))
+        _update_owners_cache(component_name, None, config)
+
+
+def load_manifest(component_name: str, config: "configuration.Configuration") -> Optional[Manifest]:
+    """Returns the manifest of an installed component.
+    Returns None if the component is not installed or was installed without recording a manifest
+    """
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            row = database.execute(
+                "SELECT manifest FROM manifests WHERE component_name = ?", (component_name,)
+            ).fetchone()
+        serialized_manifest = row[0] if row is not None else None
+    else:
+        try:
+            with open(installed_component_manifest_path(component_name, config)) as f:
+                serialized_manifest = f.read()
+        except FileNotFoundError:
+            serialized_manifest = None
+
+    if serialized_manifest is None:
+        return None
+    return {path: tuple(entry) for path, entry in json.loads(serialized_manifest).items()}
+
+
+def save_manifest(component_name: str, manifest: Manifest, config: "configuration.Configuration"):
+    """Writes the manifest of an installed component to disk"""
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            database.execute(
+                "INSERT OR REPLACE INTO manifests (component_name, manifest) VALUES (?, ?)",
+                (component_name, json.dumps(manifest)),
+            )
+        return
+
+    _create_metadata_dir(config)
+    with open(installed_component_manifest_path(component_name, config), "w") as f:
+        json.dump(manifest, f)
+
+
+def remove_manifest(component_name: str, config: "configuration.Configuration"):
+    """Deletes the manifest of an installed component from disk, if it was recorded"""
+    if uses_installed_components_database(config):
+        with _open_database(config) as database:
+            database.execute("DELETE FROM manifests WHERE component_name = ?", (component_name,))
+    elif os.path.exists(installed_component_manifest_path(component_name, config)):
+        os.remove(installed_component_manifest_path(component_name, config))
+
+
+def find_file_owners(paths: Iterable[str], config: "configuration.Configuration") -> Dict[str, List[str]]:
+    """Returns the names of the installed components owning each of the given paths (relative to the orchestra root).
+    Paths which are not owned by any component are omitted from the result.
+    """
+    paths = {_normalize_installed_path(p) for p in paths}
+    owners = defaultdict(list)
+
+    if uses_installed_components_database(config):
+        sorted_paths = sorted(paths)
+        with _open_database(config) as database:
+            for i in range(0, len(sorted_paths), _DATABASE_CHUNK_SIZE):
+                chunk = sorted_paths[i : i + _DATABASE_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = database.execute(
+                    f"SELECT path, component_name FROM files WHERE path IN ({placeholders}) ORDER BY component_name",
+                    chunk,
+                )
+                for path, component_name in rows:
+                    owners[path].append(component_name)
+        return dict(owners)
+
+    sorted_paths = sorted(paths)
+    with _owners_lock, _open_owners_cache(config) as database:
+        _synchronize_owners_cache(database, config)
+        for i in range(0, len(sorted_paths), _DATABASE_CHUNK_SIZE):
+            chunk = sorted_paths[i : i + _DATABASE_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = database.execute(
+                f"SELECT path, component_name FROM owners WHERE path IN ({placeholders}) ORDER BY component_name",
+                chunk,
+            )
+            for path, component_name in rows:
+                owners[path].append(component_name)
+
+    return dict(owners)
+
+
+def installed_files_owners_cache_path(config: "configuration.Configuration") -> str:
+    """Returns the path of the database caching the owners of the installed files when the installed components
+    database is not used, built from the .idx files of the installed components
+    """
+    return os.path.join(config.cache_dir, "installed-files-owners.sqlite3")
+
+
+@contextmanager
+def _open_owners_cache(config: "configuration.Configuration"):
+    """Opens the installed files owners cache, see `_open_database`"""
+    cache_path = installed_files_owners_cache_path(config)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    database = sqlite3.connect(cache_path, timeout=60)
+    with closing(database), database:
+        database.executescript("""
+            CREATE TABLE IF NOT EXISTS indexed_components (
+                component_name TEXT PRIMARY KEY,
+                file_list_key TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS owners (
+                path TEXT NOT NULL,
+                component_name TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS owners_by_path ON owners (path);
+            CREATE INDEX IF NOT EXISTS owners_by_component ON owners (component_name);
+            """)
+        yield database
+
+
+def _synchronize_owners_cache(database: sqlite3.Connection, config: "configuration.Configuration"):
+    """Brings the owners cache up to date with the installed components.
+    Only the .idx files which changed since they were indexed (including the ones written by other tools or older
+    orchestra versions) are read again, so the cost is proportional to the number of installed components rather than
+    to the number of installed files.
+    """
+    indexed_components = dict(database.execute("SELECT component_name, file_list_key FROM indexed_components"))
+    installed_components = {metadata["component_name"] for metadata in _installed_metadata_snapshot(config).values()}
+
+    for component_name in indexed_components.keys() - installed_components:
+        _replace_indexed_file_list(database, component_name, None, None)
+
+    for component_name in installed_components:
+        file_list_key = _file_list_key(component_name, config)
+        if file_list_key is not None and file_list_key == indexed_components.get(component_name):
+            continue
+
+        try:
+            file_list = load_file_list(component_name, config)
+        except FileNotFoundError:
+            logger.warning(f"Missing file list for installed component {component_name}")
+            file_list = None
+        _replace_indexed_file_list(database, component_name, file_list, file_list_key)
+
+
+def _update_owners_cache(component_name: str, file_list: Optional[List[str]], config: "configuration.Configuration"):
+    """Records the new file list of a component (None if it was removed) in the owners cache, if it was built"""
+    if not os.path.exists(installed_files_owners_cache_path(config)):
+        return
+
+    with _owners_lock, _open_owners_cache(config) as database:
+        _replace_indexed_file_list(database, component_name, file_list, _file_list_key(component_name, config))
+
+
+def _replace_indexed_file_list(
+    database: sqlite3.Connection,
+    component_name: str,
+    file_list: Optional[List[str]],
+    file_list_key: Optional[str],
+):
+    database.execute("DELETE FROM owners WHERE component_name = ?", (component_name,))
+    if file_list is None or file_list_key is None:
+        database.execute("DELETE FROM indexed_components WHERE component_name = ?", (component_name,))
+        return
+
+    database.executemany(
+        "INSERT INTO owners (path, component_name) VALUES (?, ?)",
+        ((path, component_name) for path in {_normalize_installed_path(p) for p in file_list}),
+    )
+    database.execute(
+        "INSERT OR REPLACE INTO indexed_components (component_name, file_list_key) VALUES (?, ?)",
+        (component_name, file_list_key),
+    )
+
+
+def _file_list_key(component_name: str, config: "configuration.Configuration") -> Optional[str]:
+    """Returns a key which changes whenever the .idx file of a component is rewritten, None if it does not exist"""
+    try:
+        info = os.stat(installed_component_file_list_path(component_name, config))
+    except FileNotFoundError:
+        return None
+    return f"{info.st_ino}:{info.st_mtime_ns}:{info.st_size}"
+
+
+def _normalize_installed_path(path: str) -> str:
+    return os.path.normpath(path.strip().lstrip("/"))
+
+
+def metadata_file_paths(component_name: str, config: "configuration.Configuration") -> List[str]:
+    """Returns the paths of the files storing the metadata of a component which have to be considered part of the
+    files installed by the component (empty when using the installed components database)
+    """
+    if uses_installed_components_database(config):
+        return []
+
+    return [
+        installed_component_file_list_path(component_name, config),
+        installed_component_metadata_path(component_name, config),
+        installed_component_manifest_path(component_name, config),
+    ]
+
 
 def _create_metadata_dir(config: "configuration.Configuration"):
     # Write file metadata and index
@@ -127,16 +432,135 @@ def _create_metadata_dir(config: "configuration.Configuration"):
     os.makedirs(metadata_dir_path, exist_ok=True)
 
 
+def uses_installed_components_database(config: "configuration.Configuration") -> bool:
+    """Returns True if the metadata of the installed components is stored in a single database instead of one
+    .json and one .idx file per component (see `migrate_to_installed_components_database`)
+    """
+    return os.path.exists(installed_components_database_path(config))
+
+
+def migrate_to_installed_components_database(config: "configuration.Configuration") -> List[str]:
+    """Moves the metadata and the file lists of all the installed components to the installed components database.
+    The database is populated under a temporary name and then atomically moved in place, only after that the old
+    .json and .idx files are deleted.
+    Returns the names of the migrated components.
+    """
+    if uses_installed_components_database(config):
+        raise UserException("The installed components database is already in use")
+
+    snapshot = _installed_metadata_snapshot(config)
+    _create_metadata_dir(config)
+
+    database_path = installed_components_database_path(config)
+    temporary_database_path = database_path + ".tmp"
+    if os.path.exists(temporary_database_path):
+        os.remove(temporary_database_path)
+
+    migrated_components = []
+    files_to_remove = []
+    with closing(_connect(temporary_database_path)) as database, database:
+        for serialized_metadata in snapshot.values():
+            component_name = serialized_metadata["component_name"]
+            metadata_files = metadata_file_paths(component_name, config)
+            metadata_files_relative_paths = {os.path.relpath(p, config.orchestra_root) for p in metadata_files}
+
+            # The file lists include the metadata files themselves, which won't exist anymore
+            file_list = [
+                f
+                for f in load_file_list(component_name, config)
+                if f.strip().lstrip("/") not in metadata_files_relative_paths
+            ]
+
+            database.execute(
+                "INSERT INTO components (component_name, metadata) VALUES (?, ?)",
+                (component_name, json.dumps(serialized_metadata)),
+            )
+            _replace_file_list(database, component_name, file_list)
+
+            manifest = load_manifest(component_name, config)
+            if manifest is not None:
+                database.execute(
+                    "INSERT INTO manifests (component_name, manifest) VALUES (?, ?)",
+                    (component_name, json.dumps(manifest)),
+                )
+
+            migrated_components.append(component_name)
+            files_to_remove.extend(metadata_files)
+
+    os.replace(temporary_database_path, database_path)
+
+    for path in files_to_remove:
+        # Components installed by older versions do not have a manifest
+        if os.path.exists(path):
+            os.remove(path)
+
+    return migrated_components
+
+
+@contextmanager
+def _open_database(config: "configuration.Configuration"):
+    """Opens the installed components database. All the statements are executed in a single transaction which is
+    committed on exit, or rolled back if an exception is raised.
+    """
+    with closing(_connect(installed_components_database_path(config))) as database, database:
+        yield database
+
+
+def _connect(database_path: str) -> sqlite3.Connection:
+    # A generous timeout lets concurrent install actions wait for each other
+    database = sqlite3.connect(database_path, timeout=60)
+    database.executescript("""
+        CREATE TABLE IF NOT EXISTS components (
+            component_name TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT NOT NULL,
+            component_name TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS files_by_path ON files (path);
+        CREATE INDEX IF NOT EXISTS files_by_component ON files (component_name);
+        CREATE TABLE IF NOT EXISTS manifests (
+            component_name TEXT PRIMARY KEY,
+            manifest TEXT NOT NULL
+        );
+        """)
+    return database
+
+
+def _replace_file_list(database: sqlite3.Connection, component_name: str, file_list: List[str]):
+    database.execute("DELETE FROM files WHERE component_name = ?", (component_name,))
+    database.executemany(
+        "INSERT INTO files (path, component_name) VALUES (?, ?)",
+        ((path, component_name) for path in file_list),
+    )
+
+
+def installed_components_database_path(config: "configuration.Configuration") -> str:
+    """Returns the path of the database containing metadata and file lists of all the installed components"""
+    return os.path.join(config.installed_component_metadata_dir, "installed-components.sqlite3")
+
+
 def installed_component_file_list_path(component_name: str, config: "configuration.Configuration") -> str:
     """Returns the path of the index containing the list of installed files of a component"""
-    return os.path.join(config.installed_component_metadata_dir, component_name.replace("/", "_") + ".idx")
+    return os.path.join(config.installed_component_metadata_dir, _metadata_key(component_name) + ".idx")
 
 
 def installed_component_metadata_path(component_name: str, config: "configuration.Configuration") -> str:
     """Returns the path of the file containing metadata about an installed component"""
-    return os.path.join(config.installed_component_metadata_dir, component_name.replace("/", "_") + ".json")
+    return os.path.join(config.installed_component_metadata_dir, _metadata_key(component_name) + ".json")
+
+
+def installed_component_manifest_path(component_name: str, config: "configuration.Configuration") -> str:
+    """Returns the path of the manifest recording size, mode and content digest of the files installed by a component"""
+    return os.path.join(config.installed_component_metadata_dir, _metadata_key(component_name) + ".manifest")
+
+
+def installed_component_journal_path(component_name: str, config: "configuration.Configuration") -> str:
+    """Returns the path of the journal listing the files created while extracting a component directly in the root"""
+    return os.path.join(config.installed_component_metadata_dir, _metadata_key(component_name) + ".journal")
 
 
 def installed_component_license_path(component_name: str, config: "configuration.Configuration") -> str:
     """Returns the path of the file containing the license of an installed component"""
-    return os.path.join(config.installed_component_metadata_dir, component_name.replace("/", "_") + ".license")
+    return os.path.join(config.installed_component_metadata_dir, _metadata_key(component_name) + ".license")
@@ -0,0 +1,134 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import sys
+from typing import Iterable, List, Optional
+
+from elftools.elf.dynamic import DynamicSegment
+from elftools.elf.elffile import ELFFile
+from loguru import logger
+
+from ..exceptions import InternalException
+
+ELF_MAGIC = b"\x7fELF"
+
+# Below this number of files to patch the cost of starting the worker processes outweighs the gain
+PROCESS_POOL_THRESHOLD = 32
+
+
+def unique_or_none(list):
+    if not list:
+        return None
+    assert len(list) == 1
+    return list[0]
+
+
+def replace_dynstr(paths: Iterable[str], root_path: str, search_strings: List[bytes], jobs: Optional[int] = None):
+    """Replaces the search strings found in the dynamic string table (.dynstr) of the given ELF files with the path of
+    root_path relative to $ORIGIN (padded with slashes to keep the same length).
+    Files which are not ELFs or do not contain any of the search strings are skipped without being parsed.
+    If there are enough files to patch they are processed by a pool of jobs worker processes.
+    :returns: the paths of the patched files
+    """
+    candidates = [path for path in paths if _may_need_patching(path, search_strings)]
+
+    if len(candidates) < PROCESS_POOL_THRESHOLD:
+        results = [fix_elf_file(path, root_path, search_strings) for path in candidates]
+    else:
+        # Worker processes are spawned rather than forked as the calling process is likely to be multithreaded
+        with multiprocessing.get_context("spawn").Pool(processes=jobs) as workers:
+            chunksize = max(1, len(candidates) // (4 * (jobs or os.cpu_count() or 1)))
+            results = workers.starmap(
+                fix_elf_file,
+                [(path, root_path, search_strings) for path in candidates],
+                chunksize=chunksize,
+            )
+
+    return [path for path, patched in zip(candidates, results) if patched]
+
+
+def _may_need_patching(path: str, search_strings: List[bytes]) -> bool:
+    """Checks the ELF magic and looks for the search strings in the whole file, without opening it read-write"""
+    with open(path, "rb") as f:
+        if f.read(len(ELF_MAGIC)) != ELF_MAGIC:
+            return False
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            return any(mapped_file.find(search_string) != -1 for search_string in search_strings)
+
+
+def fix_elf_file(path: str, root_path: str, search_strings: List[bytes]) -> bool:
+    """Patches the .dynstr of a single ELF file, returns True if the file was changed"""
+    with open(path, "rb") as elf_file:
+        elf = ELFFile(elf_file)
+        dynamic = unique_or_none([segment for segment in elf.iter_segments() if type(segment) is DynamicSegment])
+
+        if dynamic is None:
+            # Not a dynamic executable
+            return False
+
+        address = unique_or_none([tag.entry.d_val for tag in dynamic.iter_tags() if tag.entry.d_tag == "DT_STRTAB"])
+
+        offset = None
+        if address:
+            offset = unique_or_none(list(elf.address_offsets(address)))
+
+        size = unique_or_none([tag.entry.d_val for tag in dynamic.iter_tags() if tag.entry.d_tag == "DT_STRSZ"])
+
+        if offset is None or size is None:
+            # DT_STRTAB not found
+            return False
+
+        elf_file.seek(offset)
+        original = elf_file.read(size)
+
+    replace = b"$ORIGIN/" + os.fsencode(os.path.relpath(root_path, os.path.dirname(path)))
+    new = original
+    for search_string in search_strings:
+        if search_string not in new:
+            continue
+
+        if len(replace) > len(search_string):
+            raise InternalException(
+                f"Cannot patch {path}: {search_string.decode('utf-8', 'replace')} is shorter than its replacement "
+                f"{replace.decode('utf-8', 'replace')}"
+            )
+
+        new = new.replace(search_string, replace + b"/" * (len(search_string) - len(replace)))
+
+    if new == original:
+        return False
+
+    with open(path, "r+b") as elf_file, mmap.mmap(elf_file.fileno(), 0) as mapped_file:
+        mapped_file[offset : offset + size] = new
+
+    return True
+
+
+def _find_files(root_path: str) -> List[str]:
+    paths = []
+    for directory, _, file_names in os.walk(root_path):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite portions of .dynstr.")
+    parser.add_argument("path", metavar="PATH", help="path to search in.")
+    parser.add_argument("search_strings", metavar="SEARCH_STRINGS", nargs="+", help="strings to search.")
+    args = parser.parse_args()
+
+    search_strings = [os.fsencode(search_string) for search_string in args.search_strings]
+
+    for path in replace_dynstr(_find_files(args.path), args.path, search_strings):
+        logger.info(f"Patched {path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+import json
+import multiprocessing
+import os
+import re
+import stat
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from elftools.elf.dynamic import DynamicSegment
+from elftools.elf.elffile import ELFFile
+from loguru import logger
+from tqdm import tqdm
+
+from .elf_replace_dynstr import ELF_MAGIC, PROCESS_POOL_THRESHOLD
+from ..actions.merge import manifest_entry
+from ..model import configuration
+from ..model.install_metadata import (
+    installed_component_names,
+    installed_components_database_path,
+    load_file_list,
+    load_manifest,
+    uses_installed_components_database,
+)
+
+_GLIBC_VERSION = re.compile(b"GLIBC_[0-9.]*\x00")
+
+
+def unique_or_none(list):
+    if len(list) == 1:
+        return list[0]
+    else:
+        return None
+
+
+class VerifyCache:
+    """Results of the checks on the files of the root, each valid as long as inode, mtime, size and mode of the file do
+    not change
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+
+        self._entries = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self._entries = json.load(f)
+            except (IOError, json.JSONDecodeError):
+                logger.warning(f"Ignoring invalid verify cache {cache_path}")
+
+    def get(self, path: str, info: os.stat_result) -> Optional[dict]:
+        entry = self._entries.get(path)
+        if entry is None or entry["stat"] != self._stat_key(info):
+            return None
+        return entry
+
+    def set(self, path: str, info: os.stat_result, digest: Optional[str], elf: Optional[dict]):
+        self._entries[path] = {"stat": self._stat_key(info), "digest": digest, "elf": elf}
+
+    def persist(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temporary_path = self.cache_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(temporary_path, self.cache_path)
+
+    @staticmethod
+    def _stat_key(info: os.stat_result) -> List[int]:
+        return [info.st_ino, info.st_mtime_ns, info.st_size, info.st_mode]
+
+
+class RootVerifier:
+    """Checks the consistency of the orchestra root with the metadata of the installed components:
+    - files owned by multiple components
+    - files listed as installed but missing, and files not owned by any component (only when checking the whole root)
+    - files whose size, mode or content differs from the manifest recorded when they were installed
+    - ELFs with invalid runpaths, using glibc versions not provided by the `link-only` libraries or not finding
+      libraries available elsewhere in the root
+
+    The per-file checks (content digest and ELF parsing) are run by a pool of worker processes and their results are
+    cached in the orchestra cache directory, so that repeated runs only re-check the files that changed.
+    """
+
+    def __init__(self, config: "configuration.Configuration", jobs: Optional[int] = None):
+        self.root_path = config.orchestra_root
+        self.jobs = jobs
+        self.cache = VerifyCache(os.path.join(config.cache_dir, "verify_cache.json"))
+
+        # path -> components owning it, for all the installed components
+        self.owners: Dict[str, List[str]] = defaultdict(list)
+        self.file_lists: Dict[str, List[str]] = {}
+        self.manifests: Dict[str, dict] = {}
+        self.all_files: Set[str] = {"lib"}
+
+        # The database itself does not belong to any component
+        if uses_installed_components_database(config):
+            self.all_files.add(os.path.relpath(installed_components_database_path(config), self.root_path))
+
+        for component_name in installed_component_names(config):
+            file_list = [_normalize_path(path) for path in load_file_list(component_name, config)]
+            self.file_lists[component_name] = file_list
+            self.manifests[component_name] = load_manifest(component_name, config) or {}
+            for path in file_list:
+                self.owners[path].append(component_name)
+                self.all_files.add(path)
+
+        self.problems_found = False
+
+    def verify(self, component_names: Optional[Iterable[str]] = None) -> bool:
+        """Verifies the files of the given components (all the installed components if None).
+        Returns True if inconsistencies were found
+        """
+        self.problems_found = False
+        whole_root = component_names is None
+        if whole_root:
+            component_names = self.file_lists.keys()
+
+        files = set()
+        manifest = {}
+        for component_name in component_names:
+            files.update(self.file_lists[component_name])
+            manifest.update(self.manifests[component_name])
+
+        self._report_duplicates(files)
+
+        # The glibc versions allowed for all the ELFs are the ones used by link-only libraries, so they are always checked
+        link_only_files = {path for path in self.all_files if "link-only" in path}
+        checked_files = files | link_only_files
+
+        if whole_root:
+            installed_files = self._collect_installed_files()
+            self._report_files(
+                "The following files are present in root but do not belong to any component:",
+                installed_files - self.all_files,
+            )
+            missing_files = checked_files - installed_files
+        else:
+            missing_files = {path for path in checked_files if not os.path.lexists(os.path.join(self.root_path, path))}
+        self._report_files("The following files are listed as installed but are not present in root:", missing_files)
+
+        results = self._check_files(checked_files - missing_files, manifest)
+
+        self._report_files(
+            "The following files differ from the ones originally installed:",
+            [path for path, (modified, _) in results.items() if modified and path in files],
+        )
+        self._verify_elfs({path: elf for path, (_, elf) in results.items() if elf is not None}, files)
+
+        return self.problems_found
+
+    def _report_duplicates(self, files: Set[str]):
+        duplicates = sorted(path for path in files if len(self.owners[path]) > 1)
+        if duplicates:
+            self.problems_found = True
+            message = "Files in multiple components:"
+            for path in duplicates:
+                message += f"\n  {path}:"
+                for component_name in self.owners[path]:
+                    message += f"\n    {component_name}"
+            logger.error(message)
+
+    def _report_files(self, header: str, paths: Iterable[str]):
+        paths = sorted(paths)
+        if paths:
+            self.problems_found = True
+            logger.error(header + "\n" + self._format_file_list(paths, "  "))
+
+    def _collect_installed_files(self) -> Set[str]:
+        installed_files = set()
+
+        def collect(directory_path: str):
+            with os.scandir(directory_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        collect(entry.path)
+                    else:
+                        installed_files.add(os.path.relpath(entry.path, self.root_path))
+
+        collect(self.root_path)
+        return installed_files
+
+    def _check_files(self, files: Iterable[str], manifest: dict) -> Dict[str, Tuple[bool, Optional[dict]]]:
+        """Compares the files with their manifest entries and parses the executable ELFs.
+        Returns, for each regular file or symlink, whether it was modified and its ELF information (see `read_elf_info`)
+        """
+        results = {}
+        to_analyze = []
+        for path in sorted(files):
+            absolute_path = os.path.join(self.root_path, path)
+            try:
+                info = os.lstat(absolute_path)
+            except FileNotFoundError:
+                # Removed while verifying
+                self._report_files("The following files are listed as installed but are not present in root:", [path])
+                continue
+            expected = manifest.get(path)
+
+            if stat.S_ISLNK(info.st_mode):
+                modified = expected is not None and tuple(expected) != manifest_entry(absolute_path, info)
+                results[path] = (modified, None)
+                continue
+
+            if not stat.S_ISREG(info.st_mode):
+                continue
+
+            # Size and mode are enough to tell that the file was modified, without reading it
+            if expected is not None and (expected[0], expected[1]) != (info.st_size, info.st_mode):
+                results[path] = (True, None)
+                continue
+
+            cached = self.cache.get(path, info)
+            if cached is not None and (expected is None or cached["digest"] is not None):
+                results[path] = (expected is not None and cached["digest"] != expected[2], cached["elf"])
+                continue
+
+            to_analyze.append((path, absolute_path, info, expected))
+
+        if to_analyze:
+            logger.info(f"Checking {len(to_analyze)} changed files")
+            arguments = [
+                (absolute_path, expected is not None, bool(info.st_mode & 0o111))
+                for _, absolute_path, info, expected in to_analyze
+            ]
+            for (path, _, info, expected), (digest, elf) in zip(to_analyze, self._analyze(arguments)):
+                self.cache.set(path, info, digest, elf)
+                results[path] = (expected is not None and digest != expected[2], elf)
+            self.cache.persist()
+
+        return results
+
+    def _analyze(self, arguments: List[Tuple[str, bool, bool]]) -> List[Tuple[Optional[str], Optional[dict]]]:
+        progress_bar = tqdm(total=len(arguments), unit="files")
+        if len(arguments) < PROCESS_POOL_THRESHOLD:
+            results = []
+            for argument in arguments:
+                results.append(analyze_file(*argument))
+                progress_bar.update()
+        else:
+            # Worker processes are spawned rather than forked as the calling process might be multithreaded
+            with multiprocessing.get_context("spawn").Pool(processes=self.jobs) as workers:
+                chunksize = max(1, len(arguments) // (4 * (self.jobs or os.cpu_count() or 1)))
+                results = []
+                for result in workers.imap(_analyze_file_star, arguments, chunksize=chunksize):
+                    results.append(result)
+                    progress_bar.update()
+        progress_bar.close()
+        return results
+
+    def _verify_elfs(self, elfs: Dict[str, dict], files: Set[str]):
+        missing_libraries = defaultdict(list)
+        libraries_in_root = defaultdict(list)
+        for path in self.all_files:
+            if "link-only" not in path:
+                libraries_in_root[os.path.basename(path)].append(path)
+
+        allowed_glibc_versions = set()
+        used_glibc_versions = {}
+        invalid_runpaths = defaultdict(list)
+
+        for path, elf in sorted(elfs.items()):
+            if "link-only" in path:
+                allowed_glibc_versions.update(elf["glibc_versions"])
+                continue
+
+            if path not in files:
+                continue
+
+            used_glibc_versions[path] = set(elf["glibc_versions"])
+
+            runpaths = []
+            if elf["runpath"] is not None:
+                absolute_path = os.path.join(self.root_path, path)
+                runpath = elf["runpath"].replace("$ORIGIN", os.path.dirname(os.path.realpath(absolute_path)))
+                runpaths = {os.path.relpath(os.path.realpath(p), self.root_path) for p in runpath.split(":")}
+                for runpath in runpaths:
+                    runpath_path = os.path.join(self.root_path, runpath)
+                    if not (os.path.isdir(runpath_path) or os.path.islink(runpath_path)):
+                        invalid_runpaths[runpath].append(path)
+
+            for library_name in elf["needed"]:
+                candidates = (os.path.normpath(os.path.join(runpath, library_name)) for runpath in runpaths)
+                if not any(candidate in self.all_files for candidate in candidates):
+                    missing_libraries[library_name].append(path)
+
+        if invalid_runpaths:
+            self.problems_found = True
+            message = "The following runpaths are invalid:"
+            for runpath, users in sorted(invalid_runpaths.items()):
+                message += f"\n  {runpath}\n" + self._format_file_list(users, "    ")
+            logger.error(message)
+
+        for library_name, users in sorted(missing_libraries.items()):
+            if library_name in libraries_in_root:
+                logger.warning(
+                    f"{library_name} is available in root\n"
+                    f"  These are the instances:\n{self._format_file_list(libraries_in_root[library_name], '    ')}\n"
+                    f"  These are the users:\n{self._format_file_list(users, '    ')}"
+                )
+
+        by_version = defaultdict(list)
+        for path, versions in used_glibc_versions.items():
+            for version in versions - allowed_glibc_versions:
+                by_version[version].append(path)
+
+        if by_version:
+            self.problems_found = True
+            message = "The following unallowed glibc versions are being used:"
+            for version, users in sorted(by_version.items()):
+                message += f"\n  {version}\n" + self._format_file_list(users, "    ")
+            logger.error(message)
+
+    def _format_file_list(self, paths: Iterable[str], prefix: str) -> str:
+        """Formats the paths grouped by the component owning them"""
+        by_component = defaultdict(list)
+        for path in paths:
+            for component_name in self.owners.get(path) or ["(orphan)"]:
+                by_component[component_name].append(path)
+
+        lines = []
+        for component_name, component_paths in sorted(by_component.items()):
+            lines.append(f"{prefix}{component_name}:")
+            lines.extend(f"{prefix}  {path}" for path in component_paths)
+        return "\n".join(lines)
+
+
+def _analyze_file_star(arguments: Tuple[str, bool, bool]) -> Tuple[Optional[str], Optional[dict]]:
+    return analyze_file(*arguments)
+
+
+def analyze_file(path: str, compute_digest: bool, check_elf: bool) -> Tuple[Optional[str], Optional[dict]]:
+    """Returns the content digest of a file (if compute_digest is True) and its ELF information (if check_elf is True,
+    see `read_elf_info`)
+    """
+    digest = manifest_entry(path)[2] if compute_digest else None
+    elf = read_elf_info(path) if check_elf else None
+    return digest, elf
+
+
+def read_elf_info(path: str) -> Optional[dict]:
+    """Returns the glibc versions, the runpath and the needed libraries of a dynamic x86-64 ELF, or None if the file is
+    not one
+    """
+    with open(path, "rb") as elf_file:
+        if elf_file.read(len(ELF_MAGIC)) != ELF_MAGIC:
+            return None
+        elf_file.seek(0)
+
+        elf = ELFFile(elf_file)
+        if elf.header.e_machine != "EM_X86_64":
+            return None
+
+        dynamic_segment = unique_or_none(
+            [segment for segment in elf.iter_segments() if type(segment) is DynamicSegment]
+        )
+        if dynamic_segment is None:
+            return None
+
+        tags = list(dynamic_segment.iter_tags())
+        string_table_address = unique_or_none([tag.entry.d_val for tag in tags if tag.entry.d_tag == "DT_STRTAB"])
+        string_table_size = unique_or_none([tag.entry.d_val for tag in tags if tag.entry.d_tag == "DT_STRSZ"])
+        if string_table_address is None or string_table_size is None:
+            return None
+        string_table_offset = unique_or_none(list(elf.address_offsets(string_table_address)))
+        if string_table_offset is None:
+            return None
+
+        elf_file.seek(string_table_offset)
+        string_table = elf_file.read(string_table_size)
+
+    def get_string(offset):
+        return string_table[offset:].split(b"\x00")[0].decode("ascii")
+
+    runpath_offset = unique_or_none([tag.entry.d_val for tag in tags if tag.entry.d_tag == "DT_RUNPATH"])
+    return {
+        "glibc_versions": sorted(
+            {version.strip(b"\x00").decode("ascii") for version in _GLIBC_VERSION.findall(string_table)}
+        ),
+        "runpath": get_string(runpath_offset) if runpath_offset is not None else None,
+        "needed": [get_string(tag.entry.d_val) for tag in tags if tag.entry.d_tag == "DT_NEEDED"],
+    }
+
+
+def _normalize_path(path: str) -> str:
+    path = path.strip()
+    if path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
@@ -15,8 +15,6 @@ ensure_ytt_path = Path(__file__).parent / "orchestra/support/ensure_ytt.py"
 # flag ourselves
 executable_support_files = [
     "support/ytt",
-    "support/elf-replace-dynstr.py",
-    "support/verify-root",
     "support/ensure_ytt.py",
 ]
 
@@ -1,9 +1,18 @@
+import os
+import shutil
 import subprocess
+import time
 from textwrap import dedent
 
+import networkx
+import pytest
+
+from orchestra.actions.archive import BINARY_ARCHIVES_FORMATS, create_archive, extract_archive
 from orchestra.model import install_metadata
 from ..conftest import OrchestraShim
 
+requires_zstd = pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+
 
 def test_binary_archive_location(orchestra: OrchestraShim):
     """Checks that InstallAction returns the expected path for binary archives"""
@@ -68,6 +77,67 @@ def test_binary_archives_creation(orchestra: OrchestraShim):
     assert files == expected_files
 
 
+@requires_zstd
+def test_zstd_binary_archives(orchestra: OrchestraShim, tmp_path):
+    """Checks that binary archives are created in the format configured for the binary archives repository"""
+    orchestra.add_binary_archive("origin")
+    orchestra.add_overlay(
+        dedent(
+            """
+            #@ load("@ytt:overlay", "overlay")
+            #@overlay/match by=overlay.all
+            ---
+            #@overlay/match missing_ok=True
+            binary_archives_formats:
+              origin: zst
+            """
+        ).lstrip()
+    )
+    orchestra("update")
+    orchestra("install", "-b", "--create-binary-archives", "component_A")
+
+    build = orchestra.configuration.components["component_A"].builds["build0"]
+    assert build.install.binary_archive_filename.endswith(".tar.zst")
+
+    binary_archive_path = build.install.locate_binary_archive()
+    assert binary_archive_path == build.install._binary_archive_path()
+
+    extracted_files = extract_archive(binary_archive_path, str(tmp_path))
+    assert sorted(extracted_files) == ["component_A_build0_file", "component_A_file", "lib"]
+
+
+@pytest.mark.benchmark
+@requires_zstd
+def test_binary_archive_formats_benchmark(tmp_path, record_property):
+    """Measures the time required to create and extract binary archives in all the supported formats, using an
+    installed python package as a real-world component. Run with `--benchmarks`, the size and timings of each format
+    are recorded as properties of the test (see `--junitxml`).
+    """
+    component_root = os.path.dirname(networkx.__file__)
+
+    extracted_files = {}
+    for archive_format in BINARY_ARCHIVES_FORMATS:
+        archive_path = str(tmp_path / f"archive.tar.{archive_format}")
+        destination = tmp_path / archive_format
+        destination.mkdir()
+
+        start_time = time.perf_counter()
+        create_archive(component_root, archive_path)
+        creation_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        extracted_files[archive_format] = sorted(extract_archive(archive_path, str(destination)))
+        extraction_time = time.perf_counter() - start_time
+
+        record_property(f"{archive_format}_size", os.path.getsize(archive_path))
+        record_property(f"{archive_format}_creation_time", creation_time)
+        record_property(f"{archive_format}_extraction_time", extraction_time)
+
+    reference_files = extracted_files[BINARY_ARCHIVES_FORMATS[0]]
+    assert reference_files
+    assert all(files == reference_files for files in extracted_files.values())
+
+
 def test_remote_heads_cache_poisoning_works(orchestra: OrchestraShim):
     """Checks that the mechanism for poisoning the remote HEADs cache works"""
     fake_commit = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
@@ -0,0 +1,18 @@
+import os
+
+from ..orchestra_shim import OrchestraShim
+
+
+def test_inspect_owner(orchestra: OrchestraShim, capsys):
+    """Checks that `orc inspect owner` prints the components which installed the given files"""
+    orchestra("install", "-b", "component_A")
+    orchestra("install", "-b", "component_B")
+    capsys.readouterr()
+
+    absolute_path = os.path.join(orchestra.orchestra_root, "component_B_file")
+    orchestra("inspect", "owner", "component_A_file", absolute_path)
+    output = capsys.readouterr().out.splitlines()
+    assert output == ["component_A_file: component_A", f"{absolute_path}: component_B"]
+
+    orchestra("uninstall", "component_B")
+    orchestra("inspect", "owner", "component_B_file", should_fail=True)
@@ -0,0 +1,41 @@
+import os
+
+from ..orchestra_shim import OrchestraShim
+
+
+def test_verify(orchestra: OrchestraShim):
+    """Checks that `orc verify` detects modified, missing and orphan files, optionally only for some components"""
+    orchestra("install", "-b", "component_A")
+    orchestra("install", "-b", "component_B")
+    orchestra("verify")
+
+    with open(os.path.join(orchestra.orchestra_root, "component_A_file"), "w") as f:
+        f.write("modified")
+    orchestra("verify", should_fail=True)
+    orchestra("verify", "component_B")
+
+    orchestra("install", "-b", "component_A")
+    orchestra("verify")
+
+    os.remove(os.path.join(orchestra.orchestra_root, "component_B_file"))
+    orchestra("verify", "component_A")
+    orchestra("verify", "component_B", should_fail=True)
+
+    orchestra("install", "-b", "component_B")
+    with open(os.path.join(orchestra.orchestra_root, "orphan_file"), "w") as f:
+        f.write("orphan")
+    orchestra("verify", "component_A", "component_B")
+    orchestra("verify", should_fail=True)
+
+
+def test_verify_missing_link_only_file(orchestra: OrchestraShim):
+    """Checks that `orc verify` reports missing link-only libraries, which are checked even when verifying other
+    components
+    """
+    orchestra("install", "-b", "component_A")
+    orchestra("install", "-b", "component_with_link_only_file")
+    orchestra("verify", "component_A")
+
+    os.remove(os.path.join(orchestra.orchestra_root, "lib64", "link-only", "some_library.a"))
+    orchestra("verify", "component_A", should_fail=True)
+    orchestra("verify", should_fail=True)
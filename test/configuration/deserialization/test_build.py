@@ -22,6 +22,8 @@ def test_build_deserialization(orchestra: OrchestraShim):
     assert build.install.script == serialized_build["install"]
     assert build.configure.script == serialized_build["configure"]
     assert build.ndebug == serialized_build["ndebug"]
+    assert build.resources == serialized_build["resources"]
+    assert component_G.builds["build1"].resources == {}
     assert build._explicit_dependencies == serialized_build["dependencies"]
     assert build._explicit_build_dependencies == serialized_build["build_dependencies"]
 
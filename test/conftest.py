@@ -49,5 +49,20 @@ def git_repos_manager(test_data_mgr):
     return GitReposManager(test_data_mgr)
 
 
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", default=False, help="Also run the tests marked as benchmark")
+
+
 def pytest_configure(config):
     config.addinivalue_line("markers", "orchestra(setup_default_upstream=True): Orchestra fixture configuration marker")
+    config.addinivalue_line("markers", "benchmark: slow performance measurement, run only with --benchmarks")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmarks"):
+        return
+
+    skip_benchmark = pytest.mark.skip(reason="benchmarks are run only with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
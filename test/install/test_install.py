@@ -1,7 +1,14 @@
+import hashlib
 import os
+import stat
 import pytest
 from textwrap import dedent
 
+from orchestra.actions import merge
+from orchestra.actions.install import InstallAction
+from orchestra.exceptions import UserException
+from orchestra.model.install_metadata import save_file_list
+
 from ..orchestra_shim import OrchestraShim
 from ..utils.json import load_json
 from ..utils.filelist import compare_root_tree
@@ -15,6 +22,7 @@ def assert_component_A_installed_properly(orchestra: OrchestraShim, metadata_ove
     expected_file_list = {
         "./share/orchestra/component_A.idx",
         "./share/orchestra/component_A.json",
+        "./share/orchestra/component_A.manifest",
         "./some_file",
     }
     assert compare_root_tree(orchestra.orchestra_root, expected_file_list)
@@ -39,12 +47,21 @@ def assert_component_A_installed_properly(orchestra: OrchestraShim, metadata_ove
         some_file
         share/orchestra/component_A.idx
         share/orchestra/component_A.json
+        share/orchestra/component_A.manifest
         """
     ).strip()
     with open(orchestra.orchestra_root / "share/orchestra/component_A.idx") as f:
         filelist = f.read().strip()
     assert expected_index == filelist
 
+    # Test manifest
+    manifest = load_json(orchestra.orchestra_root / "share/orchestra/component_A.manifest")
+    assert list(manifest) == ["some_file"]
+    size, mode, digest = manifest["some_file"]
+    assert size == 0
+    assert stat.S_ISREG(mode)
+    assert digest == hashlib.blake2b(b"", digest_size=16).hexdigest()
+
 
 def test_install_from_source_with_no_binary_archives_configured(orchestra: OrchestraShim, capsys):
     """Checks that --fallback-build (-b) causes installation from source if no binary archives repositories are
@@ -138,6 +155,7 @@ def test_install_conflicting_builds(orchestra: OrchestraShim):
     expected_file_list_1 = {
         "./share/orchestra/component_B.idx",
         "./share/orchestra/component_B.json",
+        "./share/orchestra/component_B.manifest",
         "./some_file",
     }
     assert compare_root_tree(orchestra.orchestra_root, expected_file_list_1)
@@ -146,11 +164,94 @@ def test_install_conflicting_builds(orchestra: OrchestraShim):
     expected_file_list_2 = {
         "./share/orchestra/component_B.idx",
         "./share/orchestra/component_B.json",
+        "./share/orchestra/component_B.manifest",
         "./some_other_file",
     }
     assert compare_root_tree(orchestra.orchestra_root, expected_file_list_2)
 
 
+def test_reinstall_preserves_unchanged_files(orchestra: OrchestraShim):
+    """Checks that reinstalling a component does not replace the files whose content did not change"""
+    orchestra("install", "-b", "component_A")
+    some_file_stat = os.stat(orchestra.orchestra_root / "some_file")
+
+    orchestra("install", "-b", "component_A")
+    assert_component_A_installed_properly(orchestra)
+    new_some_file_stat = os.stat(orchestra.orchestra_root / "some_file")
+    assert new_some_file_stat.st_ino == some_file_stat.st_ino
+    assert new_some_file_stat.st_mtime_ns == some_file_stat.st_mtime_ns
+
+
+def test_reinstall_from_binary_archives_preserves_unchanged_files(orchestra: OrchestraShim):
+    """Checks that reinstalling a component from binary archives does not replace the files whose content did not
+    change
+    """
+    orchestra.add_binary_archive("origin")
+    orchestra("update")
+    orchestra("install", "-b", "--create-binary-archives", "component_A")
+    some_file_stat = os.stat(orchestra.orchestra_root / "some_file")
+
+    orchestra("install", "component_A")
+    assert_component_A_installed_properly(orchestra, metadata_overrides={"source": "binary archives"})
+    new_some_file_stat = os.stat(orchestra.orchestra_root / "some_file")
+    assert new_some_file_stat.st_ino == some_file_stat.st_ino
+    assert new_some_file_stat.st_mtime_ns == some_file_stat.st_mtime_ns
+
+
+def test_interrupted_install_from_binary_archives_is_rolled_back(orchestra: OrchestraShim, monkeypatch):
+    """Checks that the files and the metadata of the installed build are restored if an installation from binary
+    archives, which extracts the archive directly in the root, fails after replacing them
+    """
+    orchestra.add_binary_archive("origin")
+    orchestra("update")
+    orchestra("install", "-b", "--create-binary-archives", "component_A")
+
+    some_file_path = orchestra.orchestra_root / "some_file"
+    some_file_path.write_text("previous content")
+    metadata_dir = orchestra.orchestra_root / "share/orchestra"
+    previous_metadata = {path.name: path.read_text() for path in metadata_dir.iterdir()}
+
+    def interrupted_update_metadata(self, file_list, *args):
+        save_file_list(self.component.name, file_list + ["some_other_file"], self.config)
+        raise UserException("Interrupted installation")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(InstallAction, "_update_metadata", interrupted_update_metadata)
+        orchestra("install", "component_A", should_fail=True)
+
+    assert some_file_path.read_text() == "previous content"
+    assert {path.name: path.read_text() for path in metadata_dir.iterdir()} == previous_metadata
+
+    orchestra("install", "component_A")
+    assert_component_A_installed_properly(orchestra, metadata_overrides={"source": "binary archives"})
+
+
+def test_merge_into_concurrently_created_directory(tmp_path, monkeypatch):
+    """Checks that a directory created in the destination by a concurrent install after the merge checked for it is
+    merged into instead of failing the merge
+    """
+    source = tmp_path / "source"
+    (source / "lib").mkdir(parents=True)
+    (source / "lib" / "some_file").write_text("some content")
+    destination = tmp_path / "destination"
+    destination.mkdir()
+
+    merge_subdirectory = merge._Merger._merge_subdirectory
+
+    def merge_subdirectory_racing(self, entry, destination_path, destination_info, relative_path):
+        # Another install creates the same directory between the lstat and the rename
+        os.makedirs(destination_path)
+        with open(os.path.join(destination_path, "other_file"), "w") as f:
+            f.write("other content")
+        merge_subdirectory(self, entry, destination_path, destination_info, relative_path)
+
+    monkeypatch.setattr(merge._Merger, "_merge_subdirectory", merge_subdirectory_racing)
+    merge.merge_directory(str(source), str(destination))
+
+    assert (destination / "lib" / "some_file").read_text() == "some content"
+    assert (destination / "lib" / "other_file").read_text() == "other content"
+
+
 def test_test_option_runs_tests(orchestra: OrchestraShim):
     """Checks that the --test option sets the RUN_TESTS environment variable"""
     orchestra("install", "-B", "--test", "component_that_tests_test_option")
@@ -1,4 +1,5 @@
 import re
+import stat
 import subprocess
 
 from ..orchestra_shim import OrchestraShim
@@ -64,6 +65,25 @@ def test_postinstall_replace_ndebug(orchestra: OrchestraShim):
     assert "NDEBUG" not in header_file.read_text()
 
 
+def test_postinstall_replace_asan(orchestra: OrchestraShim):
+    """Checks that the postinstall pass that replaces ASAN preprocessor checks works"""
+    orchestra("install", "-b", "component_that_tests_postinstall")
+
+    header_file = orchestra.orchestra_root / "include" / "test.h"
+    header = header_file.read_text()
+    assert "address_sanitizer" not in header
+    assert "__SANITIZE_ADDRESS__" not in header
+
+
+def test_postinstall_rewrite_read_only_file(orchestra: OrchestraShim):
+    """Checks that the postinstall passes can rewrite read-only files, preserving their permissions"""
+    orchestra("install", "-b", "component_that_tests_postinstall")
+
+    header_file = orchestra.orchestra_root / "include" / "read_only.h"
+    assert "NDEBUG" not in header_file.read_text()
+    assert stat.S_IMODE(header_file.stat().st_mode) == 0o444
+
+
 def test_skip_post_install(orchestra: OrchestraShim):
     """Checks that the skip_post_install configuration option works"""
     orchestra("install", "-b", "component_that_skips_post_install")
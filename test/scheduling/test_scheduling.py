@@ -1,5 +1,11 @@
+import time
+
+import networkx as nx
 import pytest
 
+from orchestra.executor import DEFAULT_ACTION_DURATION, Executor, SOLVERS
+from orchestra.model.configuration import Configuration
+
 from ..orchestra_shim import OrchestraShim
 
 
@@ -72,3 +78,132 @@ def test_same_component_ordering(orchestra: OrchestraShim):
 
     # Install
     orchestra("install", "-b", "component_sco_A")
+
+
+def test_parallel_schedule(orchestra: OrchestraShim):
+    """Checks that running independent actions in parallel respects the dependency graph"""
+    orchestra("install", "-b", "-j", "4", "gcc")
+    orchestra("install", "-b", "-j", "4", "component_sco_A")
+
+
+def test_jobserver_advertised_to_scripts(orchestra: OrchestraShim):
+    """Checks that scripts run with a jobserver find it in MAKEFLAGS and inherit its file descriptors: the install
+    script takes a token from the read end of the pipe and puts it back through the write end
+    """
+    orchestra("install", "-b", "-j", "2", "--make-jobs", "2", "component_jobserver")
+    assert (orchestra.orchestra_root / "component_jobserver_file").exists()
+
+
+@pytest.mark.parametrize(
+    "component_name",
+    [
+        "component_A",
+        "component_with_cyclic_dependency_A",
+        "component_cyclic_C",
+        "component_sco_A",
+        "gcc",
+    ],
+)
+def test_solvers_agree(orchestra: OrchestraShim, component_name):
+    """Checks that all the solvers find the same assignment for the AnyOf choices (or fail to find any)"""
+    config = Configuration(fallback_to_build=True, override_orchestra_dotdir=orchestra.orchestra_dotdir)
+    action = config.get_build(component_name).install
+
+    solutions = {}
+    for solver in SOLVERS:
+        executor = Executor([action], solver=solver)
+        graph = executor._assign_choices(executor._create_initial_dependency_graph())
+        solutions[solver] = None if graph is None else {(str(u), str(v)) for u, v in graph.edges}
+
+    reference_solution = solutions[SOLVERS[0]]
+    assert all(solution == reference_solution for solution in solutions.values())
+
+
+@pytest.mark.benchmark
+def test_solver_benchmark(orchestra: OrchestraShim, record_property):
+    """Measures the time required to solve the dependency graph of a synthetic configuration with 1000 components,
+    which includes choices and multiple builds of the same component. Run with `--benchmarks`, the timings are
+    recorded as properties of the test (see `--junitxml`).
+    """
+    config = Configuration(fallback_to_build=True, override_orchestra_dotdir=orchestra.orchestra_dotdir)
+    actions = [config.get_build(f"component_{i}").install for i in range(990, 1000)]
+    # Installing a non-default build of some components forces intra-component ordering
+    actions += [config.components[f"component_{i}"].builds["build1"].install for i in range(0, 1000, 100)]
+
+    solved_nodes = {}
+    for solver in SOLVERS:
+        start_time = time.perf_counter()
+        graph = Executor(actions, solver=solver)._create_dependency_graph()
+        record_property(f"{solver}_time", time.perf_counter() - start_time)
+
+        assert nx.is_directed_acyclic_graph(graph)
+        assert set(actions).issubset(graph.nodes)
+        solved_nodes[solver] = {str(node) for node in graph.nodes}
+
+    reference_nodes = solved_nodes[SOLVERS[0]]
+    assert all(nodes == reference_nodes for nodes in solved_nodes.values())
+
+
+class _StubAction:
+    """Stands in for an action when testing the scheduling functions, which only look at its resources and duration"""
+
+    def __init__(self, name, resources=None, estimated_duration=None):
+        self.name = name
+        self.resources = resources or {}
+        self.estimated_duration = estimated_duration
+
+    def __repr__(self):
+        return self.name
+
+
+def test_pick_next_action_respects_resources():
+    """Checks that an action requiring more resources than the ones left free by the running actions is deferred until
+    enough resources are free, and that an action requiring more than the capacity is started once nothing else runs
+    """
+    executor = Executor([], resource_capacity={"cpu": 4})
+    running = _StubAction("running", {"cpu": 3})
+    heavy = _StubAction("heavy", {"cpu": 2})
+    light = _StubAction("light", {"cpu": 1})
+    huge = _StubAction("huge", {"cpu": 8})
+
+    # Only light fits in the free capacity
+    assert executor._pick_next_action([heavy, light], [running]) is light
+    assert executor._pick_next_action([heavy], [running]) is None
+    assert executor._pick_next_action([heavy], [running, light]) is None
+
+    # Once enough resources are free heavy is started, before lighter actions
+    assert executor._pick_next_action([heavy, light], [light]) is heavy
+    assert executor._pick_next_action([light, heavy], []) is heavy
+
+    # An action exceeding the capacity waits until nothing else is running
+    assert executor._pick_next_action([huge], [light]) is None
+    assert executor._pick_next_action([huge], []) is huge
+
+
+def test_pick_next_action_longest_critical_path_first():
+    """Checks that among the ready actions the one with the longest critical path (the chain of actions depending on
+    it, weighted by their estimated duration) is started first, even if it is shorter or lighter
+    """
+    short_tail = _StubAction("short_tail", {"cpu": 1}, estimated_duration=10)
+    long_tail = _StubAction("long_tail", {"cpu": 1}, estimated_duration=100)
+    short_head = _StubAction("short_head", {"cpu": 1}, estimated_duration=5)
+    long_head = _StubAction("long_head", {"cpu": 1}, estimated_duration=200)
+    unknown_duration = _StubAction("unknown_duration", {"cpu": 2})
+
+    # Edges go from an action to its dependencies
+    graph = nx.DiGraph()
+    graph.add_edge(long_tail, short_head)
+    graph.add_edge(short_tail, long_head)
+    graph.add_node(unknown_duration)
+
+    executor = Executor([], resource_capacity={"cpu": 4})
+    executor._priorities = Executor._compute_priorities(graph)
+    assert executor._priorities[short_head] == 105
+    assert executor._priorities[long_head] == 210
+    assert executor._priorities[unknown_duration] == DEFAULT_ACTION_DURATION
+
+    ready_actions = [short_head, unknown_duration, long_head]
+    assert executor._pick_next_action(ready_actions, []) is long_head
+    assert executor._pick_next_action([short_head, unknown_duration], [long_head]) is short_head
+    # Resources still come first: the action with the longest critical path is skipped if it does not fit
+    assert executor._pick_next_action(ready_actions, [_StubAction("running", {"cpu": 4})]) is None
@@ -0,0 +1,43 @@
+from orchestra.model.install_metadata import is_installed, load_file_list
+
+from .orchestra_shim import OrchestraShim
+from .utils.filelist import compare_root_tree
+
+
+def test_migrate_metadata(orchestra: OrchestraShim):
+    """Checks that migrating to the installed components database preserves the installed components metadata and that
+    components can still be installed and uninstalled after the migration
+    """
+    orchestra("install", "-b", "component_A")
+    orchestra("install", "-b", "component_B")
+    orchestra("migrate-metadata")
+
+    expected_file_list = {
+        "./component_A_file",
+        "./component_A_build0_file",
+        "./component_B_file",
+        "./component_B_build0_file",
+        "./share/orchestra/installed-components.sqlite3",
+    }
+    assert compare_root_tree(orchestra.orchestra_root, expected_file_list)
+
+    config = orchestra.configuration
+    assert is_installed(config, "component_A", wanted_build="build0")
+    assert sorted(load_file_list("component_A", config)) == ["component_A_build0_file", "component_A_file"]
+
+    orchestra("uninstall", "component_A")
+    orchestra("install", "-b", "component_C")
+
+    expected_file_list = {
+        "./component_A_file",
+        "./component_A_build0_file",
+        "./component_B_file",
+        "./component_B_build0_file",
+        "./component_C_file",
+        "./component_C_build0_file",
+        "./share/orchestra/installed-components.sqlite3",
+    }
+    assert compare_root_tree(orchestra.orchestra_root, expected_file_list)
+
+    # Migrating again does nothing
+    orchestra("migrate-metadata")
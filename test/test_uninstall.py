@@ -13,5 +13,6 @@ def test_uninstall(orchestra: OrchestraShim):
         "./component_B_build0_file",
         "./share/orchestra/component_B.idx",
         "./share/orchestra/component_B.json",
+        "./share/orchestra/component_B.manifest",
     }
     assert compare_root_tree(orchestra.orchestra_root, expected_file_list)